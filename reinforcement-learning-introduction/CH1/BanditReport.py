@@ -0,0 +1,45 @@
+'''
+plotting of the k-armed bandit results; imported only when a plot is requested, 
+so that BanditSim and the environment start without matplotlib/seaborn (see HEADLESS in BanditSim)
+'''
+import numpy as np
+import seaborn as sns
+import matplotlib.pyplot as plt
+
+def banditShow(data, bestAct):
+    '''
+    show k-armed bandit's reward distribution
+        data: sampled rewards, shape (samples, kArm)
+    '''
+    plt.figure()
+    sns.violinplot(data=data)
+    plt.xlabel("Action")
+    plt.ylabel("Reward distribution")
+    print("Best action is: ", bestAct)
+    
+def banditPlot(aveReward, bestActCnt, labels, regret=None):
+    '''
+    plot average reward, % optimal action and cumulative regret of each agent
+    '''
+    horizon = len(aveReward)
+    plt.figure()
+    plt.plot(range(horizon), aveReward)
+    plt.xlabel('Steps')
+    plt.ylabel('Average reward')
+    plt.legend(labels)
+    
+    plt.figure()
+    plt.plot(range(horizon), bestActCnt)
+    plt.xlabel('Steps')
+    plt.ylabel('% optimal action')
+    plt.legend(labels) 
+    
+    if regret is not None :
+        plt.figure()
+        plt.plot(range(horizon), np.cumsum(regret, axis=0))
+        plt.xlabel('Steps')
+        plt.ylabel('Cumulative regret')
+        plt.legend(labels)
+    
+def show():
+    plt.show()
@@ -1,9 +1,23 @@
 import numpy as np
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
 import Env.BanditEnv as env
-import matplotlib.pyplot as plt
+import Env.BanditAgent as agent
 
 kArm = 10
 eps = [0, 0.01, 0.1]
+AGENTS = [agent.EpsilonGreedy(0.1), agent.EpsilonGreedy(0, initial=5, alpha=0.1), agent.EpsilonGreedy(0.1, alpha=0.1),
+          agent.UCB(2), agent.GradientBandit(0.1), agent.GradientBandit(0.1, baseline=False)]
+WALK = 0.01     # random walk std of the non-stationary bandit
+NONSTATIONARY_AGENTS = [agent.EpsilonGreedy(0.1), agent.EpsilonGreedy(0.1, alpha=0.1)]
+CHUNK = 10000   # steps per chunk of the streaming driver
+BATCH = True    # True: all runs of all epsilons in lock-step with BanditTestbed; False: one Bandit object per run
+SEED = 17       # root seed of numpy.random.SeedSequence
+BLOCK = 500     # runs per testbed block, the unit of random streams and of parallel work
+WORKERS = os.cpu_count()
+HEADLESS = os.environ.get('RL_HEADLESS', '0')=='1'   # write results as .npz/.json instead of plotting
 
 def banditSim(horizon, run):
     '''
@@ -11,9 +25,10 @@ def banditSim(horizon, run):
     '''
     aveReward = np.zeros((horizon,len(eps)), dtype='float')       # average reward
     bestActCnt = np.zeros((horizon,len(eps)), dtype='float')    # best action count
+    runSeed = np.random.SeedSequence(SEED).spawn(run)            # one stream per run, same true means for every epsilon
     for i in range(0, len(eps)) :
         for cycle in range(0,run) :
-            Bandit = env.Bandit(kArm, eps[i])
+            Bandit = env.Bandit(kArm, eps[i], runSeed[cycle])
             for step in range(0,horizon) :
                 action = Bandit.getAction()
                 aveReward[step][i] += Bandit.Qvalue(action)
@@ -23,27 +38,127 @@ def banditSim(horizon, run):
     aveReward /= run            
     bestActCnt /= run
 
-    plt.figure()
-    plt.plot(range(horizon), aveReward)
-    plt.xlabel('Steps')
-    plt.ylabel('Average reward')
-    plt.legend(["eps = 0","eps = 0.01", "eps = 0.1"])
-    
-    plt.figure()
-    plt.plot(range(horizon), bestActCnt)
-    plt.xlabel('Steps')
-    plt.ylabel('% optimal action')
-    plt.legend(["eps = 0","eps = 0.01", "eps = 0.1"]) 
+    banditPlot(aveReward, bestActCnt, ['eps = {}'. format(e) for e in eps], name='banditSim')
+    
+def banditBlock(horizon, run, seed, agents):
+    '''
+    one block of runs on one BanditTestbed
+    output param.:
+        @sumReward: reward summed over the runs, shape (horizon, len(agents))
+        @sumBest: best action count summed over the runs, shape (horizon, len(agents))
+        @sumRegret: regret summed over the runs, shape (horizon, len(agents))
+    '''
+    sumReward = np.zeros((horizon,len(agents)), dtype='float')
+    sumBest = np.zeros((horizon,len(agents)), dtype='float')
+    sumRegret = np.zeros((horizon,len(agents)), dtype='float')
+    testbed = env.BanditTestbed(kArm, agents, run, seed)
+    for step in range(0,horizon) :
+        reward, best, regret = testbed.step()
+        sumReward[step] = reward.sum(axis=1)
+        sumBest[step] = best.sum(axis=1)
+        sumRegret[step] = regret.sum(axis=1)
+    return sumReward, sumBest, sumRegret
+    
+def banditSimBatch(horizon, run, seed=SEED, workers=1, plot=True, agents=eps, name='banditSimBatch'):
+    '''
+    same as banditSim, but all runs of all agents are advanced together by BanditTestbed
+    the runs are split into blocks of BLOCK runs, block b uses child b of SeedSequence(seed), 
+    and the block sums are added in block order, so the result is bit-for-bit the same for any # of workers
+    param.:
+        agents: list of agents, or of epsilon-greedy epsilons
+    '''
+    edge = list(range(0, run, BLOCK)) + [run]
+    blockSeed = np.random.SeedSequence(seed).spawn(len(edge)-1)
+    blockArgs = [(horizon, hi-lo, blockSeed[b], agents) for b, (lo, hi) in enumerate(zip(edge[:-1], edge[1:]))]
+    
+    start = time.perf_counter()
+    if workers>1 :
+        with ProcessPoolExecutor(workers) as pool :
+            result = list(pool.map(banditBlock, *zip(*blockArgs)))
+    else :
+        result = [banditBlock(*args) for args in blockArgs]
+    aveReward = sum(block[0] for block in result)/run       # average reward
+    bestActCnt = sum(block[1] for block in result)/run      # best action count
+    regret = sum(block[2] for block in result)/run          # average regret
+    print('{} runs x {} steps x {} agents, {} workers: {:.3f} s'. format(run, horizon, len(agents), workers, time.perf_counter()-start))
+    
+    if plot :
+        labels = [a.label if hasattr(a, 'label') else 'eps = {}'. format(a) for a in agents]
+        banditPlot(aveReward, bestActCnt, labels, regret, name)
+    return aveReward, bestActCnt, regret
+    
+def banditStream(horizon, run, agents, seed=SEED, walk=WALK, initial=0, chunk=CHUNK):
+    '''
+    streaming driver: one testbed of run bandits, yields the run-averaged curves chunk by chunk
+    memory is O(run*kArm) for the testbed plus O(chunk) for the buffers, independent of horizon
+    output param. (each yield):
+        @first: step index of the first row of the chunk
+        @aveReward, @bestActCnt, @regret: run averages, shape (rows of the chunk, len(agents))
+    '''
+    testbed = env.BanditTestbed(kArm, agents, run, seed, walk, initial)
+    buf = np.zeros((3, chunk, len(testbed.agents)), dtype='float')
+    for first in range(0, horizon, chunk) :
+        rows = min(chunk, horizon-first)
+        for step in range(0, rows) :
+            reward, best, regret = testbed.step()
+            buf[0, step] = reward.mean(axis=1)
+            buf[1, step] = best.mean(axis=1)
+            buf[2, step] = regret.mean(axis=1)
+        yield first, buf[0, :rows].copy(), buf[1, :rows].copy(), buf[2, :rows].copy()
+    
+def banditStreamToCsv(path, horizon, run, agents, **kwargs):
+    '''
+    run banditStream and append each chunk to a CSV file as soon as it is done, 
+    columns: step, then average reward, % optimal action and regret of each agent
+    '''
+    labels = [a.label if hasattr(a, 'label') else 'eps = {}'. format(a) for a in agents]
+    header = ','.join(['step'] + ['{} {}'. format(name, label.replace(',', ';')) for name in ('reward', 'optimal', 'regret') for label in labels])
+    start = time.perf_counter()
+    with open(path, 'w') as f :
+        f.write(header + '\n')
+        for first, aveReward, bestActCnt, regret in banditStream(horizon, run, agents, **kwargs) :
+            step = np.arange(first, first+len(aveReward))[:, None]
+            np.savetxt(f, np.hstack((step, aveReward, bestActCnt, regret)), delimiter=',', fmt='%.6g')
+            f.flush()
+            print('step {}: {:.3f} s'. format(first+len(aveReward), time.perf_counter()-start))
+    
+def banditPlot(aveReward, bestActCnt, labels, regret=None, name='bandit'):
+    '''
+    plot average reward, % optimal action and cumulative regret of each agent,
+    or in HEADLESS mode, write them to <name>.npz and <name>.json
+    '''
+    if HEADLESS :
+        result = {'aveReward': aveReward, 'bestActCnt': bestActCnt}
+        if regret is not None :
+            result['regret'] = regret
+        np.savez(name + '.npz', **result)
+        summary = {'labels': labels, 'horizon': len(aveReward)}
+        summary.update({key: value[-1].tolist() for key, value in result.items()})     # last step
+        with open(name + '.json', 'w') as f :
+            json.dump(summary, f, indent=2)
+    else :
+        import BanditReport
+        BanditReport.banditPlot(aveReward, bestActCnt, labels, regret)
     
 def main():
     # show the reward distribution of the k-armed bandit
-    env.Bandit(kArm, eps[0]).banditShow()
+    if not HEADLESS :
+        env.Bandit(kArm, eps[0], SEED).banditShow()
     
     # simulation
-    banditSim(1000, 2000)
+    if BATCH :
+        banditSimBatch(1000, 2000, workers=WORKERS)
+        # agent comparison
+        banditSimBatch(1000, 10000, workers=WORKERS, agents=AGENTS, name='banditAgents')
+        # non-stationary bandit, streamed to disk
+        banditStreamToCsv('nonstationary.csv', 10000, 2000, NONSTATIONARY_AGENTS)
+    else :
+        banditSim(1000, 2000)
     
     # show 
-    plt.show()
+    if not HEADLESS :
+        import BanditReport
+        BanditReport.show()
     
     
     
@@ -0,0 +1,131 @@
+import numpy as np
+
+class EpsilonGreedy:
+    '''
+    epsilon-greedy agent of many k-armed bandits at once
+    value estimation:
+        alpha = None: sample average, Q(a) <-- Q(a) + (R-Q(a))/N(a)
+        alpha = const: constant step-size, Q(a) <-- Q(a) + alpha*(R-Q(a))
+    initial value:
+        initial = Q1(a), e.g. optimistic initial value 5 with epsilon = 0
+    '''
+
+    def __init__(self, epsilon=0, initial=0, alpha=None):
+        '''
+        param.:
+            epsilon: epsilon-greedy
+            initial: initial action value Q1(a)
+            alpha: constant step-size, None for sample average
+        '''
+        if not(0<=epsilon<1) :
+            raise ValueError('epsilon must be in the range [0,1)')
+        self.epsilon = epsilon
+        self.initial = initial
+        self.alpha = alpha
+        self.label = 'eps = {}'. format(epsilon)
+        if initial!=0 :
+            self.label += ', Q1 = {}'. format(initial)
+        if alpha is not None :
+            self.label += ', alpha = {}'. format(alpha)
+
+    def reset(self, run, kArm):
+        '''
+        allocate (run, kArm) estimates
+        '''
+        self.Q = np.full((run, kArm), self.initial, dtype='float')     # action value of each bandit
+        self.nAction = np.zeros((run, kArm), dtype='int64')             # action number of each bandit
+        self.runIdx = np.arange(run)
+
+    def act(self, rng):
+        '''
+        get the action At of each bandit: using epsilon-greedy
+        '''
+        run, kArm = self.Q.shape
+        explore = rng.random(run) < self.epsilon
+        return np.where(explore, rng.integers(0, kArm, run), np.argmax(self.Q, axis=1))
+
+    def update(self, action, reward):
+        '''
+        estimate Q value of the taken actions
+        '''
+        self.nAction[self.runIdx, action] += 1
+        if self.alpha is None :
+            stepSize = 1/self.nAction[self.runIdx, action]
+        else :
+            stepSize = self.alpha
+        self.Q[self.runIdx, action] += stepSize*(reward - self.Q[self.runIdx, action])
+
+
+class UCB(EpsilonGreedy):
+    '''
+    upper-confidence-bound action selection of many k-armed bandits at once
+        At = argmax(Q(a) + c*sqrt(ln(t)/N(a)), a), an action with N(a) = 0 is a maximizing action
+    value estimation: as EpsilonGreedy
+    '''
+
+    def __init__(self, c=2, initial=0, alpha=None):
+        '''
+        param.:
+            c: degree of exploration
+            initial: initial action value Q1(a)
+            alpha: constant step-size, None for sample average
+        '''
+        EpsilonGreedy.__init__(self, 0, initial, alpha)
+        self.c = c
+        self.label = 'UCB, c = {}'. format(c)
+
+    def reset(self, run, kArm):
+        EpsilonGreedy.reset(self, run, kArm)
+        self.t = 0
+
+    def act(self, rng):
+        self.t += 1
+        with np.errstate(divide='ignore', invalid='ignore'):
+            bonus = np.where(self.nAction>0, self.c*np.sqrt(np.log(self.t)/self.nAction), np.inf)
+        return np.argmax(self.Q + bonus, axis=1)
+
+
+class GradientBandit:
+    '''
+    gradient bandit of many k-armed bandits at once
+        pi(a) = softmax(H(a))
+        H(At) <-- H(At) + alpha*(R-baseline)*(1-pi(At)), H(a) <-- H(a) - alpha*(R-baseline)*pi(a), a != At
+        baseline = average of all rewards so far, or 0 without baseline
+    '''
+
+    def __init__(self, alpha=0.1, baseline=True):
+        '''
+        param.:
+            alpha: step-size
+            baseline: use the average reward as baseline
+        '''
+        self.alpha = alpha
+        self.baseline = baseline
+        self.label = 'gradient, alpha = {}'. format(alpha)
+        if not baseline :
+            self.label += ', no baseline'
+
+    def reset(self, run, kArm):
+        self.H = np.zeros((run, kArm), dtype='float')       # action preference
+        self.aveReward = np.zeros(run, dtype='float')
+        self.t = 0
+        self.runIdx = np.arange(run)
+
+    def act(self, rng):
+        '''
+        sample At from pi by inverse cdf
+        '''
+        prefer = np.exp(self.H - self.H.max(axis=1, keepdims=True))
+        self.pi = prefer/prefer.sum(axis=1, keepdims=True)
+        cdf = np.cumsum(self.pi, axis=1)
+        action = np.sum(cdf < rng.random(len(cdf))[:, None], axis=1)
+        return np.minimum(action, self.H.shape[1]-1)
+
+    def update(self, action, reward):
+        self.t += 1
+        if self.baseline :
+            self.aveReward += (reward - self.aveReward)/self.t
+        gain = self.alpha*(reward - self.aveReward)[:, None]
+        self.H -= gain*self.pi
+        self.H[self.runIdx, action] += gain[:, 0]
+
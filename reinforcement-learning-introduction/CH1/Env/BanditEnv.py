@@ -1,7 +1,5 @@
-import random
 import numpy as np
-import seaborn as sns
-import matplotlib.pyplot as plt
+from Env import BanditAgent
 
 class Bandit:
     '''
@@ -12,11 +10,12 @@ class Bandit:
         Using epsilon-greedy to explore and exploit
     '''
     
-    def __init__(self, kArm, epsilon):
+    def __init__(self, kArm, epsilon, seed=None):
         '''
         param.:
             kArm: number of arms, k-armed bandit problem
             epsilon: epsilon-greedy
+            seed: seed of the random stream of this bandit, int or numpy.random.SeedSequence
         '''
         if not(isinstance(kArm, int)and(kArm>0)) :
             raise ValueError('kArm must be a positive integer')
@@ -34,9 +33,9 @@ class Bandit:
         self.nAction = []       # action number of each bandit    
         self.Q = []             # action value of each bandit
         # initialization 
-        np.random.seed(17)
+        self.rng = np.random.default_rng(seed)
         for _ in range(0, self.nArm):
-            self.reward.append(np.random.randn())   # m -> N(0,1)
+            self.reward.append(self.rng.standard_normal())   # m -> N(0,1)
             self.nAction.append(0)
             self.Q.append(0)
         
@@ -46,11 +45,9 @@ class Bandit:
         '''
         show k-armed bandit's reward distribution
         '''
-        data1 = np.random.randn(1000, self.nArm) + self.reward   # reward distribution
-        sns.violinplot(data=data1)
-        plt.xlabel("Action")
-        plt.ylabel("Reward distribution")
-        print("Best action is: ", self.bestAct)
+        import BanditReport     # plotting only, loaded on demand
+        data1 = self.rng.standard_normal((1000, self.nArm)) + self.reward   # reward distribution
+        BanditReport.banditShow(data1, self.bestAct)
         
          
     def getAction(self):
@@ -58,9 +55,9 @@ class Bandit:
         get the action At:
             using epsilon-greedy to get the action            
         '''
-        tmp = random.uniform(0,1) 
+        tmp = self.rng.uniform(0,1) 
         if tmp<=self.epsilon :                  # explore
-            random.shuffle(self.index)
+            self.rng.shuffle(self.index)
             return self.index[0]
         else :                                  # exploit
             return np.argmax(self.Q)
@@ -73,7 +70,7 @@ class Bandit:
             using sample average to estimate Q(a) <-- Q(a) + (R-Q(a))/N(a)
         '''   
         # generate a reward 
-        reward = self.reward[action] + random.gauss(0,1)   # reward: m + N(0,1)
+        reward = self.reward[action] + self.rng.standard_normal()   # reward: m + N(0,1)
         self.nAction[action] += 1
         
         # sample average
@@ -82,4 +79,69 @@ class Bandit:
         return reward
         
         
+class BanditTestbed:
+    '''
+    k-armed bandit testbed: many runs of k-armed Bandit for several agents, advanced in lock-step.
+    agents: see BanditAgent, a number means EpsilonGreedy(epsilon) with sample average
+    stationary (walk = 0), or non-stationary: all true means take an independent random walk m <-- m + N(0,walk^2) each step
+    NOTE:
+        each agent keeps (run, kArm) arrays, one row per run
+        true means: (run, kArm), shared by all agents of the same run
+        all runs of one testbed share one random stream; to shard an experiment, give each testbed (block of runs)
+        its own child of numpy.random.SeedSequence(seed).spawn(), the result then does not depend on where the blocks run
+    '''
+    
+    def __init__(self, kArm, agents, run, seed=None, walk=0, initial=None):
+        '''
+        param.:
+            kArm: number of arms, k-armed bandit problem
+            agents: list of agents, or of epsilon-greedy epsilons
+            run: number of independent bandits
+            seed: seed of the random stream of this testbed, int or numpy.random.SeedSequence
+            walk: std of the random walk of the true means per step, 0 for a stationary bandit
+            initial: initial true mean of every arm, None for m -> N(0,1)
+        '''
+        if not(isinstance(kArm, int)and(kArm>0)) :
+            raise ValueError('kArm must be a positive integer')
+        else : 
+            self.nArm = kArm
+        
+        self.agents = [agent if hasattr(agent, 'act') else BanditAgent.EpsilonGreedy(agent) for agent in agents]
+        self.nRun = run
+        for agent in self.agents :
+            agent.reset(self.nRun, self.nArm)
+        
+        self.rng = np.random.default_rng(seed)
+        self.walk = walk
+        if initial is None :
+            self.reward = self.rng.standard_normal((self.nRun, self.nArm))     # m -> N(0,1), reward of each bandit is N(m,1)
+        else :
+            self.reward = np.full((self.nRun, self.nArm), initial, dtype='float')
+        self.bestAct = np.argmax(self.reward, axis=1)
+        self.bestReward = np.max(self.reward, axis=1)
+        self.runIdx = np.arange(self.nRun)
+        
+        
+    def step(self):
+        '''
+        one time step of every bandit of every agent: action At, reward Rt = m(At) + N(0,1), agent update
+        output param.:
+            @reward: Rt, shape (len(agents), run)
+            @best: At is the best action, shape (len(agents), run)
+            @regret: m(best action) - m(At), shape (len(agents), run)
+        '''
+        if self.walk :
+            self.reward += self.walk*self.rng.standard_normal((self.nRun, self.nArm))
+            self.bestAct = np.argmax(self.reward, axis=1)
+            self.bestReward = np.max(self.reward, axis=1)
+        shape = (len(self.agents), self.nRun)
+        reward = np.empty(shape)
+        action = np.empty(shape, dtype='int64')
+        for i, agent in enumerate(self.agents) :
+            action[i] = agent.act(self.rng)
+            reward[i] = self.reward[self.runIdx, action[i]] + self.rng.standard_normal(self.nRun)
+            agent.update(action[i], reward[i])
+        
+        return reward, action==self.bestAct, self.bestReward - self.reward[self.runIdx, action]
+        
                 
@@ -0,0 +1,161 @@
+import numpy as np
+from scipy import sparse
+
+
+class GridMapEnv:
+    '''
+    configurable GridWorld Env: stationary environment
+        state space {S}: rows*cols grids, state s = i*cols + j of grid (i,j)
+        action space {A}: left, up, right, down
+        action prob. pi(a|s): equiprobability
+        state tran. p(s'|s,a): 1
+        cells:
+            empty: normal actions, R = stepReward
+            wall: can't be entered, actions moving agent into a wall or off the grid keep it in place, R = bumpReward
+            terminal: absorbing, every action keeps agent in place, R = 0
+            teleport (i,j) -> (i',j'): every action moves agent out of (i,j) to (i',j'), R = reward of the teleport
+    NOTE:
+        only int32/float32 arrays of shape (S, A) are stored, no per-cell Python objects;
+        wall cells keep their index (self-loop, R = 0) so that the value function is a plain rows*cols array
+    '''
+
+    def __init__(self, shape, walls=None, terminals=None, teleports=(), stepReward=0, bumpReward=-1):
+        '''
+        Constructor
+        input param.:
+            @shape: (rows, cols)
+            @walls: bool array of shape (rows, cols), True for a wall
+            @terminals: bool array of shape (rows, cols), True for an absorbing terminal
+            @teleports: list of ((i,j), (i',j'), reward)
+            @stepReward: reward of a normal action
+            @bumpReward: reward of an action taking agent off the grid or into a wall
+        '''
+        self.shape = tuple(shape)
+        self.action = ['L', 'U', 'R', 'D']      # left, up, right, down
+        self.tran = {'L':0.25, 'U':0.25, 'R':0.25, 'D':0.25}    # default policy: uniform sampling pi(a|s)= 0.25
+        rows, cols = self.shape
+        nState = rows*cols
+        if walls is None :
+            walls = np.zeros(self.shape, dtype='bool')
+        if terminals is None :
+            terminals = np.zeros(self.shape, dtype='bool')
+        self.walls = np.asarray(walls, dtype='bool').ravel()
+        self.terminals = np.asarray(terminals, dtype='bool').ravel()
+
+        # query s' and reward using table search: [state][action]
+        move = {'L': (0,-1), 'U': (-1,0), 'R': (0,1), 'D': (1,0)}
+        state = np.arange(nState, dtype='int32')
+        i, j = np.divmod(state, np.int32(cols))
+        self.next_state_index = np.empty((nState, len(self.action)), dtype='int32')
+        self.reward = np.empty((nState, len(self.action)), dtype='float32')
+        for a, act in enumerate(self.action) :
+            nextI = i + np.int32(move[act][0])
+            nextJ = j + np.int32(move[act][1])
+            off = (nextI<0) | (nextI>=rows) | (nextJ<0) | (nextJ>=cols)
+            nextState = np.where(off, state, nextI*np.int32(cols)+nextJ)
+            blocked = off | self.walls[nextState]
+            self.next_state_index[:, a] = np.where(blocked, state, nextState)
+            self.reward[:, a] = np.where(blocked, bumpReward, stepReward)
+
+        # absorbing cells
+        still = self.walls | self.terminals
+        self.next_state_index[still] = state[still, None]
+        self.reward[still] = 0
+
+        # teleports
+        for src, dst, reward in teleports :
+            if self.walls[self.state_index(src)] or self.walls[self.state_index(dst)] :
+                raise ValueError('teleport {} -> {} touches a wall'. format(src, dst))
+            self.next_state_index[self.state_index(src)] = self.state_index(dst)
+            self.reward[self.state_index(src)] = reward
+
+        # default policy, a read-only view: no (S, A) copy
+        self.policy = np.broadcast_to(np.array([self.tran[act] for act in self.action], dtype='float32'), (nState, len(self.action)))
+
+        # initialize value of each state
+        self.value = np.zeros(self.shape, dtype='float')
+
+
+    def state_index(self, grid):
+        '''
+        grid (i,j) -> state s = i*cols + j
+        '''
+        return grid[0]*self.shape[1] + grid[1]
+
+
+    def policy_model(self):
+        '''
+        MDP under self.policy, for exact policy evaluation: v = r_pi + gamma * P_pi * v
+        output param.:
+            @tranPi: P_pi[s,s'] = sum(pi(a|s), a: next_state_index[s,a] = s'), scipy.sparse CSR, shape (S, S)
+            @rewardPi: r_pi[s] = sum(pi(a|s)*reward[s,a], a), shape (S,)
+        NOTE:
+            both are float64 whatever the storage of policy/reward, so that the linear solve is not done in float32
+        '''
+        nState, nAction = self.next_state_index.shape
+        row = np.repeat(np.arange(nState, dtype='int32'), nAction)
+        policy = np.asarray(self.policy, dtype='float')
+        tranPi = sparse.csr_matrix((policy.ravel(), (row, self.next_state_index.ravel())), shape=(nState, nState))   # duplicates are summed
+        rewardPi = np.sum(policy*self.reward, axis=1)
+        return tranPi, rewardPi
+
+
+    def mdp_tables(self, gamma=0.9):
+        '''
+        the env in the layout of MDP.TabularMDP: (P, R, mask, gamma, shape)
+            P[a]: one 1 per row, at next_state_index[:,a]; every action is legal
+        input param.:
+            @gamma: discount, the env has none (GridWorld.GAMMA)
+        '''
+        nState, nAction = self.next_state_index.shape
+        state = np.arange(nState)
+        P = [sparse.csr_matrix((np.ones(nState), (state, self.next_state_index[:, a])), shape=(nState, nState)) for a in range(0, nAction)]
+        return P, self.reward, None, gamma, self.shape
+
+
+def load_map(path, teleports=(), stepReward=0, bumpReward=-1):
+    '''
+    build a GridMapEnv from a map file
+        .npy: int array of shape (rows, cols), 0 = empty, 1 = wall, 2 = terminal; teleports from the argument
+        text: one line per grid row, '.' = empty, '#' = wall, 'T' = terminal,
+              then, after the grid, one directive per line:
+                  teleport i j i' j' reward
+                  step reward
+                  bump reward
+              lines starting with ';' are comments
+    '''
+    teleports = list(teleports)
+    if path.endswith('.npy') :
+        cells = np.load(path)
+        return GridMapEnv(cells.shape, cells==1, cells==2, teleports, stepReward, bumpReward)
+
+    grid = []
+    with open(path) as f :
+        for line in f :
+            line = line.rstrip('\n')
+            word = line.split()
+            if not word or line.startswith(';') :
+                continue
+            if word[0]=='teleport' :
+                teleports.append(((int(word[1]), int(word[2])), (int(word[3]), int(word[4])), float(word[5])))
+            elif word[0]=='step' :
+                stepReward = float(word[1])
+            elif word[0]=='bump' :
+                bumpReward = float(word[1])
+            else :
+                grid.append(line.strip())
+    if len(set(map(len, grid)))!=1 :
+        raise ValueError('all grid rows of {} must have the same length'. format(path))
+    cells = np.frombuffer(''.join(grid).encode('ascii'), dtype='uint8').reshape(len(grid), len(grid[0]))
+    return GridMapEnv(cells.shape, cells==ord('#'), cells==ord('T'), teleports, stepReward, bumpReward)
+
+
+
+if __name__ == '__main__' :
+    import os
+    new = load_map(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Maps', 'Example3_8.txt'))
+    for i in range(0,new.shape[0]) :
+        for j in range(0,new.shape[1]) :
+            for a, act in enumerate(new.action) :
+                sPrime = int(new.next_state_index[new.state_index([i,j]), a])
+                print("state: {}, action: {}, next state: {}, reward: {}". format([i,j], act, list(divmod(sPrime, new.shape[1])), new.reward[new.state_index([i,j]), a]))
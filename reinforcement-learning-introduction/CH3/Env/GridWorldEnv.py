@@ -1,7 +1,10 @@
-import numpy as np
+try :
+    from Env.GridMapEnv import GridMapEnv
+except ImportError :        # run as a script: python Env/GridWorldEnv.py
+    from GridMapEnv import GridMapEnv
 
 
-class GridWorldEnv:
+class GridWorldEnv(GridMapEnv):
     '''
     GridWorld Env: stationary environment
         state space {S}: 5*5 grids
@@ -15,90 +18,40 @@ class GridWorldEnv:
                 actions taking agent off the grid, R = -1
                 actions movings agent out of special state A(0,1), R = 10
                                                            B(0,3), R = 5
+    NOTE:
+        a GridMapEnv without walls or terminals, the same as load_map('Maps/Example3_8.txt') at size 5
     '''
 
 
-    def __init__(self):
+    def __init__(self, size=5):
         '''
         Constructor
+        input param.:
+            @size: size*size grid, A, A', B, B' keep their positions and must fit in the grid
+        table search, state s = i*SIZE + j of grid (i,j), action a = index of self.action:
+            self.next_state_index[s,a]: s'
+            self.reward[s,a]: r
+            self.policy[s,a]: pi(a|s)
         '''
-        self.SIZE = 5                           # 5*5 grid
-        self.action = ['L', 'U', 'R', 'D']      # left, up, right, down
-        self.tran = {'L':0.25, 'U':0.25, 'R':0.25, 'D':0.25}    # default policy: uniform sampling pi(a|s)= 0.25
+        self.SIZE = size                        # size*size grid
         self.A = [0, 1]         # special state A position
         self.APrime = [4, 1]    # special state A' position
         self.B = [0, 3]         # special state B position
         self.BPrime = [2, 3]    # special state B' position
-
-        # initialize value of each state
-        self.value = np.zeros((self.SIZE,self.SIZE), dtype='float')
-        
-        # query s' and reward using table search: [grid x][grid y][action]
-        self.next_state = []
-        self.reward = []
-        for i in range(0,self.SIZE) :
-            self.next_state.append([])
-            self.reward.append([])
-            for j in range(0,self.SIZE) :
-                action = {}
-                reward = {}
-                ## state machine switch   
-                # up action
-                if i==0 :
-                    action['U'] = [i,j]
-                    reward['U'] = -1
-                else :
-                    action['U'] = [i-1,j]
-                    reward['U'] = 0
-                    
-                # down action
-                if i==self.SIZE-1 :
-                    action['D'] = [i,j]
-                    reward['D'] = -1
-                else :
-                    action['D'] = [i+1,j]        
-                    reward['D'] = 0
-                
-                # left action
-                if j==0 :
-                    action['L'] = [i,j]
-                    reward['L'] = -1
-                else :
-                    action['L'] = [i,j-1]
-                    reward['L'] = 0
-                        
-                # right action
-                if j==self.SIZE-1 :
-                    action['R'] = [i,j]
-                    reward['R'] = -1
-                else :
-                    action['R'] = [i,j+1]
-                    reward['R'] = 0
-                
-                ## special case
-                # A position
-                if [i,j] == self.A :
-                    action['L'] = action['R'] = action['U'] = action['D'] = self.APrime
-                    reward['L'] = reward['R'] = reward['U'] = reward['D'] = 10 
-                
-                # B position
-                if [i,j] == self.B :
-                    action['L'] = action['R'] = action['U'] = action['D'] = self.BPrime
-                    reward['L'] = reward['R'] = reward['U'] = reward['D'] = 5 
-                    
-                self.next_state[i].append(action)
-                self.reward[i].append(reward)
-                    
+        if self.SIZE<5 :
+            raise ValueError('size must be at least 5')
+        GridMapEnv.__init__(self, (size, size), teleports=[(self.A, self.APrime, 10), (self.B, self.BPrime, 5)])
                      
             
         
 if __name__ == '__main__' :
-    new = GridWorldEnv(0.9)
+    new = GridWorldEnv()
     for i in range(0,new.SIZE) :
         for j in range(0,new.SIZE) :
-            for act in new.action :
+            for a, act in enumerate(new.action) :
                 print('action: ', act)
-                print("state: {}, next state: {}". format([i,j], new.next_state[i][j][act]))
+                sPrime = int(new.next_state_index[new.state_index([i,j]), a])
+                print("state: {}, next state: {}". format([i,j], [sPrime//new.SIZE, sPrime%new.SIZE]))
                     
         
             
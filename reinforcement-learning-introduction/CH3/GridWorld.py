@@ -1,93 +1,300 @@
 import numpy as np
+import time
+from scipy import sparse
+from scipy.sparse import linalg
 import Env.GridWorldEnv as env
-import matplotlib.pyplot as plt
+import Env.GridMapEnv as mapEnv
 
 GAMMA = 0.9
-new = env.GridWorldEnv()
+SIZE = 5        # SIZE*SIZE grid
+new = env.GridWorldEnv(SIZE)
 
 ERROR = 1e-3 
 STEPS = 200
+EVAL = 'iterate'    # policy evaluation of valueSim: 'iterate', or exact 'direct' (sparse LU), 'gmres', 'bicgstab'
+BUFFERED = True     # sweeps on preallocated ping-pong buffers, see bufferedSim
+DTYPE = 'float64'   # storage of v(s) and q(s,a) of the buffered sweeps, 'float32' halves the memory
+BENCHMARK = False   # True: main() also times the solvers on grids up to 10^7 cells (minutes, ~1 GB)
 
-def valueSim():
+def valueSim(model=new, verbose=True, steps=STEPS, method=EVAL, buffered=BUFFERED, dtype=DTYPE):
     '''
     policy evaluation: v(s) at the default policy 
         v(s) = E{Gt|s} = sum(pi(a|s)*q(s,a), a)
         q(s,a) = r(s,a) + gamma*sum(p(s'|s,a)*v(s'),s')
         r(s,a) = sum(r*p(r|s,a), r)
         where, p(s',r|s,a) = p(s'|s,a) = p(r|s,a) = 1
+    all states at once: q = reward + gamma*v[next_state_index], v = sum(policy*q, a)
+    input param.:
+        @model: GridWorldEnv, or GridMapEnv
+        @verbose: print v(s)
+        @steps: max # of sweeps
+        @method: 'iterate' for the sweeps below, otherwise see valueExact
+        @buffered: use bufferedSim
+        @dtype: value storage of bufferedSim
+    output param.:
+        @value: v(s)
+        @step: # of sweeps, or of solver iterations
     ''' 
-    lastValue = np.zeros((new.SIZE,new.SIZE),dtype='float')
-    for step in range(0,STEPS):
-        new.value = np.zeros((new.SIZE,new.SIZE),dtype='float')
-        for i in range(0,new.SIZE) :
-            for j in range(0,new.SIZE) :
-                    for act in new.action :
-                        sPrime = new.next_state[i][j][act]
-                        new.value[i,j] += new.tran[act] * (new.reward[i][j][act] + GAMMA * lastValue[sPrime[0], sPrime[1]]) 
+    if method!='iterate' :
+        return valueExact(model, verbose, method)
+    if buffered :
+        value, _, step = bufferedSim(model, verbose, steps, False, dtype)
+        return value, step
+    
+    lastValue = np.zeros(model.shape[0]*model.shape[1], dtype='float')
+    for step in range(0,steps):
+        value = np.sum(model.policy * (model.reward + GAMMA * lastValue[model.next_state_index]), axis=1)
+        model.value = value.reshape(model.shape)
         
-        err = np.sum(np.abs(new.value-lastValue))
+        err = np.sum(np.abs(value-lastValue))
         
         if err<=ERROR :
-            print('stable v(s) at step :', step)
-            print(new.value)
+            if verbose :
+                print('stable v(s) at step :', step)
+                print(model.value)
             break                
         else :
-            lastValue = new.value
+            lastValue = value
             
-        if step==STEPS-1 :
+        if step==steps-1 and verbose :
             print('Unstable stable v(s):')
-            print(new.value)
+            print(model.value)
+    
+    return model.value, step+1
+    
+
+def valueExact(model=new, verbose=True, method='direct'):
+    '''
+    exact policy evaluation: solve (I - gamma*P_pi) v = r_pi
+        P_pi, r_pi: sparse transition matrix and expected reward under model.policy, see model.policy_model()
+    input param.:
+        @method: 'direct': sparse LU (scipy.sparse.linalg.spsolve)
+                 'gmres', 'bicgstab': Krylov solver, (I - gamma*P_pi) is not symmetric, so no CG
+    output param.:
+        @value: v(s)
+        @step: # of solver iterations, 1 for 'direct'
+    '''
+    tranPi, rewardPi = model.policy_model()
+    system = (sparse.identity(tranPi.shape[0], format='csr') - GAMMA*tranPi).tocsc()
+    step = 1
+    if method=='direct' :
+        value = linalg.spsolve(system, rewardPi)
+    elif method in ('gmres', 'bicgstab') :
+        count = [0]
+        def callback(_) :
+            count[0] += 1
+        if method=='gmres' :
+            value, info = linalg.gmres(system.tocsr(), rewardPi, rtol=1e-10, atol=0, callback=callback, callback_type='pr_norm')
+        else :
+            value, info = linalg.bicgstab(system.tocsr(), rewardPi, rtol=1e-10, atol=0, callback=callback)
+        if info!=0 :
+            raise RuntimeError('{} did not converge: info = {}'. format(method, info))
+        step = count[0]
+    else :
+        raise ValueError('unknown policy evaluation method: ' + method)
+    
+    model.value = value.reshape(model.shape)
+    if verbose :
+        print('exact v(s) by {}, {} iterations:'. format(method, step))
+        print(model.value)
+    return model.value, step
+    
+
+def bufferedSim(model=new, verbose=True, steps=STEPS, optimal=False, dtype=DTYPE):
+    '''
+    sweeps of valueSim/optValueSim without per-sweep allocation
+        two preallocated v(s) buffers are swapped each sweep, q(s,a) and |v-lastV| are written into preallocated arrays with out=
+        model.reward and model.policy are used as stored, no casted copies
+        the greedy policy is computed once, after the last sweep
+    input param.:
+        @optimal: False: v = sum(policy*q, a), True: v = max(q, a)
+        @dtype: 'float64' or 'float32'
+    output param.:
+        @value: v(s), a view of one of the buffers
+        @optPolicy: int8 index of the greedy action of each state
+        @step: # of sweeps
+    NOTE:
+        err sums |v-lastV| over all states, so with float32 on very large grids rounding alone may keep err above ERROR;
+        the sweeps then stop at steps
+    '''
+    nState, nAction = model.next_state_index.shape
+    buffer = np.zeros((2, nState), dtype=dtype)
+    qValue = np.empty((nState, nAction), dtype=dtype)
+    diff = np.empty(nState, dtype=dtype)
+    
+    def backup(lastValue, value) :
+        np.take(lastValue, model.next_state_index, out=qValue, mode='clip')     # mode='raise' would buffer out
+        np.multiply(qValue, GAMMA, out=qValue)
+        np.add(qValue, model.reward, out=qValue)
+        if optimal :
+            np.max(qValue, axis=1, out=value)
+        else :
+            np.sum(np.multiply(qValue, model.policy, out=qValue), axis=1, out=value)
+    
+    for step in range(0,steps):
+        lastValue, value = buffer[step%2], buffer[1-step%2]
+        backup(lastValue, value)
+        np.subtract(value, lastValue, out=diff)
+        err = np.sum(np.abs(diff, out=diff))
+        
+        if err<=ERROR :
+            break
     
+    model.value = value.reshape(model.shape)
+    backup(value, lastValue)        # q(s,a) at the final v(s); lastValue is free now
+    optPolicy = np.argmax(qValue, axis=1).astype('int8').reshape(model.shape)
+    if verbose :
+        print('stable v(s) at step :' if err<=ERROR else 'Unstable stable v(s):', step)
+        print(model.value)
+    return model.value, optPolicy, step+1
     
 
-def optValueSim():
+def optValueSim(model=new, verbose=True, steps=STEPS, buffered=BUFFERED, dtype=DTYPE):
     '''
     calculate optimal policy and related v(s): policy evaluation & improvement using value iteration
         optimal v(s) = max(q(s,a), a)
         q(s,a) = r(s,a) + gamma*sum(p(s'|s,a)*v(s'),s')
         r(s,a) = sum(r*p(r|s,a), r)
         where, p(s',r|s,a) = p(s'|s,a) = p(r|s,a) = 1
+    all states at once: q = reward + gamma*v[next_state_index], v = max(q, a)
+    input param.:
+        @model: GridWorldEnv, or GridMapEnv
+        @verbose: print v(s) and the optimal policy
+        @steps: max # of sweeps
+        @buffered: use bufferedSim
+        @dtype: value storage of bufferedSim
+    output param.:
+        @value: v(s)
+        @optPolicy: index of the optimal action of each state
+        @step: # of sweeps
     '''
-    lastValue = np.zeros((new.SIZE,new.SIZE),dtype='float')
-    for step in range(0,STEPS):
-        optPolicy = []  
-        new.value = np.zeros((new.SIZE,new.SIZE),dtype='float')
-        for i in range(0,new.SIZE) :
-            optPolicy.append([])
-            for j in range(0,new.SIZE) :
-                tmp = []
-                # policy evaluation
-                for act in new.action :
-                    sPrime = new.next_state[i][j][act]
-                    tmp.append(new.reward[i][j][act] + GAMMA * lastValue[sPrime[0], sPrime[1]])     
-                # policy improvement
-                new.value[i,j] = max(tmp)                                                       
-                optPolicy[i].append(new.action[np.argmax(tmp)])
+    if buffered :
+        value, optPolicy, step = bufferedSim(model, verbose, steps, True, dtype)
+        if verbose :
+            policyShow(model, optPolicy)
+        return value, optPolicy, step
+    
+    lastValue = np.zeros(model.shape[0]*model.shape[1], dtype='float')
+    for step in range(0,steps):
+        # policy evaluation
+        qValue = model.reward + GAMMA * lastValue[model.next_state_index]
+        # policy improvement
+        value = qValue.max(axis=1)
+        optPolicy = np.argmax(qValue, axis=1).reshape(model.shape)
+        model.value = value.reshape(model.shape)
                 
-        err = np.sum(np.abs(new.value-lastValue))
+        err = np.sum(np.abs(value-lastValue))
         if err<=ERROR :
-            print('stable v(s) at step :', step)
-            print(new.value)
+            if verbose :
+                print('stable v(s) at step :', step)
+                print(model.value)
             break                
         else :
-            lastValue = new.value
+            lastValue = value
             
-        if step==STEPS-1 :
+        if step==steps-1 and verbose :
             print('Unstable stable v(s):')
-            print(new.value)        
+            print(model.value)        
+    
+    if verbose :
+        policyShow(model, optPolicy)
+    
+    return model.value, optPolicy, step+1
     
-    for i in range(0,new.SIZE) :
-        for j in range(0,new.SIZE) :
-            print(optPolicy[i][j].rjust(4), end=' ')
+
+def policyShow(model, optPolicy):
+    for i in range(0,model.shape[0]) :
+        for j in range(0,model.shape[1]) :
+            print(model.action[optPolicy[i,j]].rjust(4), end=' ')
         print()    
     
+    
+def benchmarkEval(sizes=(100, 316, 1000)):
+    '''
+    equiprobable-policy evaluation time: fixed-point sweeps vs. exact solvers, on empty size*size grids
+    '''
+    for size in sizes :
+        model = mapEnv.GridMapEnv((size, size))
+        reference = None
+        for method in ('iterate', 'direct', 'gmres', 'bicgstab') :
+            start = time.perf_counter()
+            value, step = valueSim(model, verbose=False, method=method)
+            elapsed = time.perf_counter()-start
+            if reference is None :
+                reference = valueExact(model, verbose=False)[0].copy()
+            print('{} cells, {}: {:.3f} s, {} iterations, max |v - v_direct| = {:.2e}'. format(
+                  size*size, method, elapsed, step, np.max(np.abs(value-reference))))
+    
+
+def benchmarkSweep(sizes=(1000, 3162), steps=10):
+    '''
+    sweep time and peak memory of optValueSim: per-sweep allocation vs. ping-pong buffers (float64, float32)
+    '''
+    import tracemalloc
+    for size in sizes :
+        model = mapEnv.GridMapEnv((size, size), stepReward=-1)
+        for buffered, dtype in ((False, 'float64'), (True, 'float64'), (True, 'float32')) :
+            tracemalloc.start()
+            start = time.perf_counter()
+            _, _, sweeps = optValueSim(model, verbose=False, steps=steps, buffered=buffered, dtype=dtype)
+            sweepTime = (time.perf_counter()-start)/sweeps
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print('{} cells, {}: {:.3f} s/sweep, peak {} MB'. format(
+                  size*size, dtype+(' buffered' if buffered else ''), sweepTime, peak//2**20))
+    
+
+def benchmark(sizes=(316, 1000, 3162), wallRate=0.2, steps=10):
+    '''
+    build time and value iteration sweep time (over the first steps sweeps) of random GridMapEnv mazes of size*size cells
+    '''
+    rng = np.random.default_rng(0)
+    for size in sizes :
+        walls = rng.random((size, size)) < wallRate
+        terminals = np.zeros((size, size), dtype='bool')
+        walls[0, 0] = walls[size//2, size//2] = walls[-1, -1] = False
+        terminals[-1, -1] = True
+        start = time.perf_counter()
+        model = mapEnv.GridMapEnv((size, size), walls, terminals, [((0, 0), (size//2, size//2), 10)], stepReward=-1)
+        buildTime = time.perf_counter()-start
+        start = time.perf_counter()
+        _, _, sweeps = optValueSim(model, verbose=False, steps=steps)
+        sweepTime = (time.perf_counter()-start)/sweeps
+        print('{} cells: build {:.3f} s, tables {} MB, {:.3f} s/sweep'. format(
+              size*size, buildTime, (model.next_state_index.nbytes+model.reward.nbytes)//2**20, sweepTime))
+    
+
+def benchmarkMDP(model=new):
+    '''
+    shared MDP solvers on the grid vs. optValueSim
+    needs the MDP package on the import path, see MDP/__init__.py
+    '''
+    from MDP.TabularMDP import TabularMDP      # loaded on demand
+    from MDP import Solver
+    reference, _, _ = optValueSim(model, verbose=False, steps=1000)
+    mdp = TabularMDP(*model.mdp_tables(GAMMA))
+    Solver.benchmark(mdp, 'grid {}x{}'. format(*model.shape), reference)
+    
 
 def main():
     print('Default policy:')
     valueSim()
      
+    print('Default policy, exact:')
+    valueExact()
+    
     print('Optimal policy')
     optValueSim()
+    
+    print('Corridor map, optimal policy')
+    optValueSim(mapEnv.load_map('Maps/Corridor.txt'))
+    
+    if BENCHMARK :
+        benchmarkMDP()
+        benchmarkMDP(mapEnv.load_map('Maps/Corridor.txt'))
+        benchmarkEval()
+        benchmarkSweep()
+        benchmark()
      
     
 
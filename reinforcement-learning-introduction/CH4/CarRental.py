@@ -1,11 +1,21 @@
 ###
 import Env.CarRentalEnv as env
+import Env.MultiCarRentalEnv as multiEnv
 import numpy as np
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
 #import matplotlib
 
 # initialization
 ERROR = 1e-3
-STEPS = 100
+STEPS = 300
+SOLVER = 'batch'    # 'batch': vectorized value iteration; 'sweep': state-by-state value iteration; 'policy': policy iteration
+                    # 'prioritized': prioritized sweeping
+                    # 'parallel': batched value iteration of the multi-location model on a process pool
+BUDGET = 200000     # max # of single-state backups of prioritized sweeping
+WORKERS = os.cpu_count()    # # of processes of the parallel solver
 new = env.CarRentalEnv()
 
 
@@ -70,8 +80,332 @@ def value_iterateion():
         print()          
     
     
+def value_iteration_batch(model=new, verbose=True):
+    '''
+    Value iteration, batched:
+        q(s,a) of all states and actions per sweep by model.q_values,
+        infeasible actions are masked as -inf, then v(s) = max(q(s,a), a) and pi(s) = argmax(q(s,a), a) in one call
+    input param.:
+        @model: CarRentalEnv, or MultiCarRentalEnv
+        @verbose: print per-sweep timing and residual
+    output param.:
+        @stateValue: v(s)
+        @optPolicy: pi(s), # of cars moving from A to B (CarRentalEnv), or net car flow into each location (MultiCarRentalEnv)
+        @sweepTime: time of each sweep in seconds
+    '''
+    mask = np.where(model.feasible, 0, -np.inf)         # action constraint
+    action = np.asarray(model.action)
+    stateValue = np.zeros(model.feasible.shape[:-1], dtype='float')
+    sweepTime = []
+    for step in range(0,STEPS) :
+        start = time.perf_counter()
+        qValue = model.q_values(stateValue) + mask
+        lastValue = stateValue
+        stateValue = qValue.max(axis=-1)
+        err = np.sum(np.abs(stateValue-lastValue))
+        sweepTime.append(time.perf_counter()-start)
+        if verbose :
+            print('step {}: {:.3f} ms, residual {:.6f}'. format(step, 1e3*sweepTime[-1], err))
+        # convergence?
+        if err<=ERROR :
+            if verbose :
+                print('Stable state value at step ', step)
+            break
+        
+        if step==STEPS-1 and verbose :
+            print('Unstable stable v(s):')
+        
+    optPolicy = action[np.argmax(model.q_values(stateValue) + mask, axis=-1)]
+    if verbose :
+        print(stateValue)
+        if optPolicy.ndim==2 :
+            for i in range(0,optPolicy.shape[0]) :
+                for j in range(0,optPolicy.shape[1]) :
+                    print(str(optPolicy[i,j]).rjust(4), end=' ')
+                print()
+        print('total {:.3f} ms in {} sweeps'. format(1e3*sum(sweepTime), len(sweepTime)))
+    
+    return stateValue, optPolicy, sweepTime
+    
+    
+def policy_iteration(model=new, verbose=True):
+    '''
+    Policy iteration:
+        policy evaluation: solve (I - gamma*P_pi) v = r_pi exactly
+        policy improvement: pi(s) = argmax(q(s,a), a), a feasible;
+                            keep the old action on ties, so that the loop stops once the policy is stable
+    input param.:
+        @model: CarRentalEnv
+        @verbose: print per-iteration timing
+    output param.:
+        @stateValue: v(s)
+        @optPolicy: pi(s), # of cars moving from A to B
+        @iterTime: time of each evaluation & improvement step in seconds
+    '''
+    mask = np.where(model.feasible, 0, -np.inf)         # action constraint
+    action = np.array(model.action, dtype='int8')
+    carA, carB = np.indices((model.MAX_CARS+1, model.MAX_CARS+1))
+    policy = np.full((model.MAX_CARS+1, model.MAX_CARS+1), model.action.index(0))    # no car moving
+    identity = np.eye(policy.size)
+    iterTime = []
+    for step in range(0,STEPS) :
+        start = time.perf_counter()
+        # policy evaluation
+        tranPi, rewardPi = model.policy_model(policy)
+        stateValue = np.linalg.solve(identity - model.GAMMA*tranPi, rewardPi).reshape(policy.shape)
+        # policy improvement
+        qValue = model.q_values(stateValue) + mask
+        greedy = np.argmax(qValue, axis=2)
+        improve = qValue[carA, carB, greedy] > qValue[carA, carB, policy] + 1e-9
+        policy = np.where(improve, greedy, policy)
+        iterTime.append(time.perf_counter()-start)
+        if verbose :
+            print('step {}: {:.3f} ms, {} states changed'. format(step, 1e3*iterTime[-1], np.sum(improve)))
+        if not improve.any() :
+            if verbose :
+                print('Stable policy at step ', step)
+            break
+    
+    optPolicy = action[policy]
+    if verbose :
+        print(stateValue)
+        for i in range(0,model.MAX_CARS+1) :
+            for j in range(0,model.MAX_CARS+1) :
+                print(str(optPolicy[i,j]).rjust(4), end=' ')
+            print()
+        print('total {:.3f} ms in {} iterations'. format(1e3*sum(iterTime), len(iterTime)))
+    
+    return stateValue, optPolicy, iterTime
+    
+    
+def prioritized_sweeping(model=new, budget=BUDGET, verbose=True):
+    '''
+    Prioritized sweeping: asynchronous, in-place value iteration
+        priority of each state is (an upper bound of) its Bellman residual, 
+        the state with the largest residual is backed up first: v(s) = max(q(s,a), a)
+        after v(s) changes by delta, the residual of each predecessor p grows by at most gamma*max(p(s|p,a), a)*|delta|
+        stop when the sum of residuals <= ERROR, as the L1 check of value iteration, or the budget is used up
+    NOTE:
+        almost every state is a predecessor of every other state, so each backup re-prioritizes the whole grid;
+        the priority queue is therefore a flat array and argmax pops its top, a heap would only add push overhead
+    input param.:
+        @model: CarRentalEnv
+        @budget: max # of single-state backups
+        @verbose: print the # of backups
+    output param.:
+        @stateValue: v(s)
+        @optPolicy: pi(s), # of cars moving from A to B
+        @backups: # of single-state backups
+    '''
+    mask = np.where(model.feasible, 0, -np.inf)         # action constraint
+    action = np.array(model.action, dtype='int8')
+    stateValue = np.zeros(model.feasible.shape[:-1], dtype='float')
+    
+    # initial residuals of all states
+    priority = np.abs((model.q_values(stateValue) + mask).max(axis=2) - stateValue)
+    backups = 0
+    while backups<budget :
+        if np.sum(priority)<=ERROR :
+            break
+        state = np.unravel_index(np.argmax(priority), priority.shape)
+        priority[state] = 0
+        # backup
+        newValue = np.max(model.state_q_values(state, stateValue) + mask[state])
+        delta = abs(newValue - stateValue[state])
+        stateValue[state] = newValue
+        backups += 1
+        # predecessors
+        priority += model.GAMMA*delta*model.predecessor_prob(state)
+    
+    optPolicy = action[np.argmax(model.q_values(stateValue) + mask, axis=2)]
+    if verbose :
+        if backups==budget :
+            print('Budget used up, {} backups'. format(backups))
+        else :
+            print('Stable state value after {} backups'. format(backups))
+        print(stateValue)
+    
+    return stateValue, optPolicy, backups
+    
+    
+# parallel value iteration: state of each worker process, set once by worker_init()
+workerModel = None
+workerArrays = None
+workerShm = None
+
+
+def worker_init(model, shmNames, shape):
+    '''
+    worker initializer: the model is pickled once per worker, the value arrays are attached from shared memory
+    '''
+    global workerModel, workerArrays, workerShm
+    workerModel = model
+    workerModel.mask = np.where(model.feasible.reshape(model.R.shape), 0, -np.inf)
+    workerShm = [shared_memory.SharedMemory(name=name) for name in shmNames]
+    workerArrays = [np.ndarray(shape, dtype='float', buffer=shm.buf) for shm in workerShm]
+    
+    
+def worker_task(lo, hi, src):
+    '''
+    one block of one sweep, block = states with s[0] = [lo,hi), no other synchronization inside the sweep
+        w = tran[0] * x on the rows [lo-MAX_MOVE_CARS, hi+MAX_MOVE_CARS), the rows the moves of the block reach,
+            w(s) = sum(p(s'|s)*v(s'), s') of the state s after moving
+        v'(s) = max(R[s,a] + gamma*w(s+d_a) + mask, a), written in place: only this block reads its rows of v
+        x' = v' contracted with tran[i] along the location axes i>=1, the x of the next sweep
+    NOTE:
+        the halo rows of w are computed by the neighbour blocks too, but w is < 1% of a sweep, the max over the actions is the rest
+    input param.:
+        @src: index of the shared array holding x, x' is written to the other one
+    output param.:
+        @pid, @elapsed: worker id and time spent on this block
+        @err: sum(|v'-v|) of this block
+    '''
+    start = time.perf_counter()
+    model = workerModel
+    stateValue, contracted, nextContracted = workerArrays[0], workerArrays[1+src], workerArrays[2-src]
+    haloLo, haloHi = max(0, lo-model.MAX_MOVE_CARS), min(stateValue.shape[0], hi+model.MAX_MOVE_CARS)
+    moveValue = np.tensordot(model.tran[0][haloLo:haloHi], contracted, axes=([1], [0]))
+    
+    stride = stateValue[0].size
+    qValue = model.R[lo*stride:hi*stride] + model.GAMMA*moveValue.ravel()[model.move[lo*stride:hi*stride]-haloLo*stride] + model.mask[lo*stride:hi*stride]
+    block = qValue.max(axis=1).reshape(stateValue[lo:hi].shape)
+    err = np.sum(np.abs(block-stateValue[lo:hi]))
+    stateValue[lo:hi] = block
+    
+    for i in range(1, model.N_LOC) :
+        block = np.moveaxis(np.tensordot(model.tran[i], block, axes=([1], [i])), 0, i)
+    nextContracted[lo:hi] = block
+    return os.getpid(), time.perf_counter()-start, err
+    
+    
+def value_iteration_parallel(model, workers=WORKERS, blocks=None, verbose=True):
+    '''
+    Value iteration, batched, on a process pool:
+        the state grid is split into blocks along the 1st location, one task per block and sweep (see worker_task),
+        so each sweep waits on the pool once; the value arrays live in shared memory instead of being pickled per task
+    input param.:
+        @model: MultiCarRentalEnv
+        @workers: # of processes
+        @blocks: # of state blocks, default one per worker
+        @verbose: print per-sweep residual and per-worker timing
+    output param.:
+        @stateValue: v(s)
+        @workerTime: total time of each worker process in seconds
+        @sweeps: # of sweeps
+    '''
+    shape = model.stateShape
+    if blocks is None :
+        blocks = workers
+    edge = np.linspace(0, shape[0], min(blocks, shape[0])+1).astype(int)
+    
+    # v, and x of this and of the next sweep; v = 0 so x = 0
+    nbytes = int(np.prod(shape))*np.dtype('float').itemsize
+    shm = [shared_memory.SharedMemory(create=True, size=nbytes) for _ in range(0,3)]
+    arrays = [np.ndarray(shape, dtype='float', buffer=buf.buf) for buf in shm]
+    for array in arrays :
+        array[...] = 0
+    workerTime = {}
+    src = 0
+    try :
+        with ProcessPoolExecutor(workers, initializer=worker_init, initargs=(model, [buf.name for buf in shm], shape)) as pool :
+            for step in range(0,STEPS) :
+                result = list(pool.map(worker_task, edge[:-1], edge[1:], [src]*(len(edge)-1)))
+                for pid, elapsed, _ in result :
+                    workerTime[pid] = workerTime.get(pid, 0) + elapsed
+                err = sum(blockErr for _, _, blockErr in result)
+                src = 1-src
+                if verbose :
+                    print('step {}: residual {:.6f}'. format(step, err))
+                # convergence?
+                if err<=ERROR :
+                    break
+        stateValue = arrays[0].copy()
+    finally :
+        del arrays
+        for buf in shm :
+            buf.close()
+            buf.unlink()
+    
+    if verbose :
+        for pid in sorted(workerTime) :
+            print('worker {}: {:.3f} ms'. format(pid, 1e3*workerTime[pid]))
+    return stateValue, workerTime, step+1
+    
+    
+def benchmark_parallel(maxCars=(20, 20, 20), workers=(1, 2, 4, 8, 16)):
+    '''
+    wall-clock time of the parallel solver vs. # of workers
+    '''
+    model = multiEnv.MultiCarRentalEnv(maxCars=maxCars, request=((3, 4)*len(maxCars))[:len(maxCars)], ret=((3, 2)*len(maxCars))[:len(maxCars)])
+    start = time.perf_counter()
+    valueBatch, _, sweepTime = value_iteration_batch(model, verbose=False)
+    print('batched, 1 process: {} sweeps, {:.3f} ms'. format(len(sweepTime), 1e3*(time.perf_counter()-start)))
+    for n in workers :
+        start = time.perf_counter()
+        stateValue, workerTime, sweeps = value_iteration_parallel(model, workers=n, verbose=False)
+        elapsed = time.perf_counter()-start
+        print('{} workers: {} sweeps, {:.3f} ms, busy time per worker {} ms, max |v - v_batch| = {:.2e}'. format(
+              n, sweeps, 1e3*elapsed, [round(1e3*t) for t in workerTime.values()], np.max(np.abs(stateValue-valueBatch))))
+    
+    
+def compare(model=new):
+    '''
+    wall-clock time and # of sweeps: batched value iteration vs. policy iteration
+    '''
+    valueVI, policyVI, sweepTime = value_iteration_batch(model, verbose=False)
+    valuePI, policyPI, iterTime = policy_iteration(model, verbose=False)
+    print('value iteration:  {} sweeps, {:.3f} ms'. format(len(sweepTime), 1e3*sum(sweepTime)))
+    print('policy iteration: {} iterations, {:.3f} ms'. format(len(iterTime), 1e3*sum(iterTime)))
+    print('max |v_VI - v_PI| = {:.6f}, # of states with different policy: {}'. format(np.max(np.abs(valueVI-valuePI)), np.sum(policyVI!=policyPI)))
+    start = time.perf_counter()
+    valuePS, policyPS, backups = prioritized_sweeping(model, verbose=False)
+    print('prioritized sweeping: {} backups ({} backups in value iteration), {:.3f} ms'. format(backups, len(sweepTime)*valueVI.size, 1e3*(time.perf_counter()-start)))
+    print('max |v_VI - v_PS| = {:.6f}, # of states with different policy: {}'. format(np.max(np.abs(valueVI-valuePS)), np.sum(policyVI!=policyPS)))
+    
+    
+def benchmark(maxCars=(20, 40, 60, 80, 100), nLoc=2):
+    '''
+    batched value iteration time of the multi-location model at scaled-up car holding per location
+    input param.:
+        @maxCars: max car holding per location of each run
+        @nLoc: # of locations, request/return rates cycle through Jack's (3,4)/(3,2)
+    '''
+    for cars in maxCars :
+        start = time.perf_counter()
+        model = multiEnv.MultiCarRentalEnv(maxCars=(cars,)*nLoc, request=((3, 4)*nLoc)[:nLoc], ret=((3, 2)*nLoc)[:nLoc])
+        buildTime = time.perf_counter()-start
+        modelBytes = sum(tran.nbytes for tran in model.tran)
+        _, _, sweepTime = value_iteration_batch(model, verbose=False)
+        print('{} locations x {} cars: build {:.3f} ms, transition model {} KB, {} sweeps, {:.3f} ms/sweep, {:.3f} ms total'. format(
+              nLoc, cars, 1e3*buildTime, modelBytes//1024, len(sweepTime), 1e3*np.mean(sweepTime), 1e3*sum(sweepTime)))
+    
+    
+def benchmark_mdp(model=new):
+    '''
+    shared MDP solvers vs. value_iteration_batch
+    needs the MDP package on the import path, see MDP/__init__.py
+    '''
+    from MDP.TabularMDP import TabularMDP      # loaded on demand
+    from MDP import Solver
+    reference, _, _ = value_iteration_batch(model, verbose=False)
+    Solver.benchmark(TabularMDP.from_env(model), 'car rental', reference)
+    
+    
 def main():
-    value_iterateion()   
+    if SOLVER=='batch' :
+        value_iteration_batch()
+        benchmark()
+    elif SOLVER=='policy' :
+        policy_iteration()
+        compare()
+        benchmark_mdp()
+    elif SOLVER=='prioritized' :
+        prioritized_sweeping()
+        compare()
+    elif SOLVER=='parallel' :
+        benchmark_parallel()
+    else :
+        value_iterateion()   
 
         
 if __name__ == '__main__':
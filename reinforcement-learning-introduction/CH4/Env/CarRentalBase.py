@@ -0,0 +1,111 @@
+###
+import numpy as np
+
+class CarRentalBase:
+    '''
+    Jack's car rental, what the 2- and N-location models share
+        car rental fee: $10/car
+        car moving fee: $2/car
+        car request/return prob. per day: poisson, one table of pmf and upper tail for all configured rates
+        one-location day model p(n'|n) and expected rental fee, see location_model()
+    NOTE:
+        the subclasses set self.action and build their own transition model in build_model()
+    '''
+
+    def __init__(self, maxCars, maxMoveCars, request, ret):
+        '''
+        Constructor
+        input param.:
+            @maxCars: max car holding per location, the size of the poisson table
+            @maxMoveCars: max car moving per night
+            @request: {location: poisson rate of car request}
+            @ret: {location: poisson rate of car return}
+        '''
+        self.CAR_RENTAL = 10
+        self.CAR_MOVE_FEE = 2
+        self.MAX_MOVE_CARS = maxMoveCars
+        self.MAX_CARS = maxCars
+        self.CAR_REQUEST = dict(request)
+        self.CAR_RETURN = dict(ret)
+        self.GAMMA = 0.9     # discounted coeff.
+
+        # poisson table: pmf and upper tail of each configured rate
+        self.RATES = sorted(set(self.CAR_REQUEST.values()) | set(self.CAR_RETURN.values()))
+        self.poiPmf, self.poiTail = self.poisson_table(self.RATES, self.MAX_CARS)
+
+
+    def poisson_table(self, rates, maxN):
+        '''
+        poisson pmf and upper-tail table, built once
+        input param.:
+            @rates: poisson rates lam
+            @maxN: n = [0,maxN]
+        output param.:
+            @pmf: pmf[i,n] = exp(-lam)*lam^n/n!, lam = rates[i]
+            @tail: tail[i,n] = p(N>=n) = 1 - sum(pmf[i,k], k<n)
+        NOTE:
+            pmf[n] = pmf[n-1]*lam/n, no factorial overflow for large n
+        '''
+        lam = np.array(rates, dtype='float')[:, None]
+        n = np.arange(1, maxN+1)
+        ratio = np.concatenate((np.exp(-lam), np.broadcast_to(lam, (len(rates), maxN))/n), axis=1)
+        pmf = np.cumprod(ratio, axis=1)
+        tail = np.ones_like(pmf)
+        tail[:, 1:] = np.clip(1 - np.cumsum(pmf[:, :-1], axis=1), 0, 1)
+        return pmf, tail
+
+
+    def poisson_pmf(self, n, lam):
+        '''
+        poisson pmf: p(n,lam) = exp(-lam)*lam^n/n!, table search
+        '''
+        return self.poiPmf[self.RATES.index(lam), n]
+
+
+    def truncated_pmf(self, n, lam):
+        '''
+        distribution of min(N, n), N -> poisson(lam)
+        output param.:
+            @prob: prob[k] = p(k,lam) for k<n, prob[n] = p(N>=n), sum(prob) = 1
+        '''
+        row = self.RATES.index(lam)
+        prob = self.poiPmf[row, :n+1].copy()
+        prob[n] = self.poiTail[row, n]
+        return prob
+
+
+    def location_model(self, lamReq, lamRtn, maxCars=None):
+        '''
+        one-location day model, independent of the other locations once the cars are moved
+        input param.:
+            @lamReq: poisson rate of car request
+            @lamRtn: poisson rate of car return
+            @maxCars: max car holding of this location, default MAX_CARS
+        output param.:
+            @tran: p(n'|n), n = # of cars after moving, n' = # of cars at the end of day2, shape (maxCars+1, maxCars+1)
+            @reward: sum(r*p(n'|n), n'), expected rental fee of this location
+            @mass: sum(p(n'|n), n'), = 1 since the tails are folded into the boundary states
+        NOTE:
+            same truncation as CarRentalEnv.transition(): carReq = [0,n], carRtn = [0,MAX_CARS-(n-carReq)]
+            reqKernel[n,m] = p(carReq=n-m), m = n-carReq <= n, p(carReq=n) = p(N>=n)
+            rtnKernel[m,n'] = p(carRtn=n'-m), n' >= m, p(carRtn=MAX_CARS-m) = p(N>=MAX_CARS-m)
+            tran = reqKernel * rtnKernel
+        '''
+        if maxCars is None :
+            maxCars = self.MAX_CARS
+        cars = np.arange(0, maxCars+1)
+        pmfReq = self.poiPmf[self.RATES.index(lamReq), :maxCars+1]
+        tailReq = self.poiTail[self.RATES.index(lamReq), :maxCars+1]
+        pmfRtn = self.poiPmf[self.RATES.index(lamRtn), :maxCars+1]
+        tailRtn = self.poiTail[self.RATES.index(lamRtn), :maxCars+1]
+
+        diff = cars[:, None] - cars[None, :]        # diff[i,j] = i-j
+        reqKernel = np.where(diff>=0, pmfReq[np.clip(diff, 0, maxCars)], 0)
+        reqKernel[:, 0] = tailReq                   # all cars rented
+        rtnKernel = np.where(diff<=0, pmfRtn[np.clip(-diff, 0, maxCars)], 0)
+        rtnKernel[:, -1] = tailRtn[::-1]            # returned cars beyond MAX_CARS are discarded
+
+        tran = reqKernel.dot(rtnKernel)
+        mass = tran.sum(axis=1)
+        reward = self.CAR_RENTAL * (reqKernel*diff).dot(rtnKernel.sum(axis=1))
+        return tran, reward, mass
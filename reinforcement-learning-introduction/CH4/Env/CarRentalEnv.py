@@ -1,9 +1,11 @@
 ###
 import numpy as np
-import scipy.stats as stat
-from math import *
+try :
+    from Env.CarRentalBase import CarRentalBase
+except ImportError :        # run as a script: python Env/CarRentalEnv.py
+    from CarRentalBase import CarRentalBase
 
-class CarRentalEnv:
+class CarRentalEnv(CarRentalBase):
     '''
     Jack's car rental 
         two locations: A, B
@@ -19,33 +21,127 @@ class CarRentalEnv:
         Reward: car rental fee - car moving fee              
     '''
     
-    def __init__(self):
+    def __init__(self, maxCars=20, maxMoveCars=5):
         '''
         Constructor
+        input param.:
+            @maxCars: max car holding per location
+            @maxMoveCars: max car moving per night
         '''
-        self.CAR_RENTAL = 10
-        self.CAR_MOVE_FEE = 2
-        self.MAX_MOVE_CARS = 5  
-        self.MAX_CARS = 20      
-        self.CAR_REQUEST = {'A':3, 'B':4}   # A -> poisson(3,n), B -> poisson(4,n)
-        self.CAR_RETURN = {'A':3, 'B':2}    # A -> poisson(3,n), B -> poisson(2,n)
-        
+        CarRentalBase.__init__(self, maxCars, maxMoveCars, request={'A':3, 'B':4}, ret={'A':3, 'B':2})
         self.action = [_ for _ in range(-self.MAX_MOVE_CARS, self.MAX_MOVE_CARS+1)]  # action space
-        self.GAMMA = 0.9     # discounted coeff.
-        self.poiTable = {}  # poisson table
         
+        # dense model, built once: R[s,a] and factored p(s'|s,a)
+        self.build_model()
+        
+        
+    def build_model(self):
+        '''
+        precompute the whole MDP once:
+            self.tranA, self.tranB: p(n'|n) at loc A and B, the joint p(s'|s,a) = tranA[s[0]-a, s'[0]] * tranB[s[1]+a, s'[1]]
+            self.moveA, self.moveB: # of cars at loc A and B after moving, [s[0], s[1], a]
+            self.feasible: action constraint, [s[0], s[1], a]
+            self.R: r(s,a) = sum(r*p(s',r|s,a)) - a*CAR_MOVE_FEE, [s[0], s[1], a]
+        '''
+        self.tranA, rewardA, massA = self.location_model(self.CAR_REQUEST['A'], self.CAR_RETURN['A'])
+        self.tranB, rewardB, massB = self.location_model(self.CAR_REQUEST['B'], self.CAR_RETURN['B'])
+        
+        carA, carB = np.indices((self.MAX_CARS+1, self.MAX_CARS+1))
+        act = np.array(self.action)
+        moveA = carA[:, :, None] - act
+        moveB = carB[:, :, None] + act
+        self.feasible = (moveA>=0) & (moveA<=self.MAX_CARS) & (moveB>=0) & (moveB<=self.MAX_CARS)
+        # infeasible actions are clipped, the solver masks them out with self.feasible
+        self.moveA = np.clip(moveA, 0, self.MAX_CARS)
+        self.moveB = np.clip(moveB, 0, self.MAX_CARS)
+        
+        # after moving, loc A and B are independent: E[rA+rB] = rA*massB + massA*rB
+        moveReward = np.outer(rewardA, massB) + np.outer(massA, rewardB)
+        self.R = moveReward[self.moveA, self.moveB] - self.CAR_MOVE_FEE*np.abs(act)
         
-    def poisson_pmf(self, n, lam):
+        # predecessor_prob(): p(n'|n) by n', with a column of 0 at n = MAX_CARS+1 for the infeasible moves,
+        # and n = # of cars after moving, [a, # of cars before moving]
+        cars = np.arange(0, self.MAX_CARS+2)
+        self.predA = np.where(cars<=self.MAX_CARS, self.tranA.T[:, np.clip(cars, 0, self.MAX_CARS)], 0)
+        self.predB = np.where(cars<=self.MAX_CARS, self.tranB.T[:, np.clip(cars, 0, self.MAX_CARS)], 0)
+        shiftA = cars[None, :-1] - act[:, None]
+        shiftB = cars[None, :-1] + act[:, None]
+        self.shiftA = np.where((shiftA>=0) & (shiftA<=self.MAX_CARS), shiftA, self.MAX_CARS+1)
+        self.shiftB = np.where((shiftB>=0) & (shiftB<=self.MAX_CARS), shiftB, self.MAX_CARS+1)
+        
+        
+    def q_values(self, stateValue):
+        '''
+        q(s,a) of all states and actions at once
+        input param.:
+            @stateValue: v(s), shape (MAX_CARS+1, MAX_CARS+1)
+        output param.:
+            @qValue: q(s,a) = R[s,a] + gamma * sum(p(s'|s,a)*v(s'), s'), shape (MAX_CARS+1, MAX_CARS+1, len(self.action))
+                     entries with self.feasible==False are meaningless
+        NOTE:
+            sum(p(s'|s,a)*v(s'), s') = (tranA * v * tranB^T)[s[0]-a, s[1]+a]
+        '''
+        moveValue = self.tranA.dot(stateValue).dot(self.tranB.T)
+        return self.R + self.GAMMA*moveValue[self.moveA, self.moveB]
+    
+    
+    def state_q_values(self, state, stateValue):
+        '''
+        q(s,a) of one state and all actions, for single-state (in-place) backups
+        input param.:
+            @state: # of cars at loc A and B at the end of day1
+            @stateValue: v(s)
+        output param.:
+            @qValue: q(s,a), shape (len(self.action),), entries with self.feasible[s]==False are meaningless
+        '''
+        moveA = self.tranA[self.moveA[state[0], state[1]]]
+        moveB = self.tranB[self.moveB[state[0], state[1]]]
+        nextValue = np.einsum('ki,ij,kj->k', moveA, stateValue, moveB)
+        return self.R[state[0], state[1]] + self.GAMMA*nextValue
+    
+    
+    def predecessor_prob(self, state):
+        '''
+        max(p(state|s,a), a) of every state s, the largest influence v(state) has on q(s,.)
+        output param.:
+            @prob: shape (MAX_CARS+1, MAX_CARS+1)
+        NOTE:
+            p(state|s,a) = tranA[s[0]-a, state[0]] * tranB[s[1]+a, state[1]], 0 if a is infeasible,
+            so each action adds an outer product of two shifted columns: O(S*A) per call, no (S, S) table
+        '''
+        probA = self.predA[state[0]][self.shiftA]      # [a, s[0]]
+        probB = self.predB[state[1]][self.shiftB]      # [a, s[1]]
+        return np.max(probA[:, :, None]*probB[:, None, :], axis=0)
+    
+    
+    def policy_model(self, policy):
+        '''
+        MDP under a fixed deterministic policy, for exact policy evaluation: v = r_pi + gamma * P_pi * v
+        input param.:
+            @policy: action index of each state, shape (MAX_CARS+1, MAX_CARS+1), must be feasible
+        output param.:
+            @tranPi: P_pi[s,s'] = p(s'|s,pi(s)), shape ((MAX_CARS+1)^2, (MAX_CARS+1)^2), s = s[0]*(MAX_CARS+1)+s[1]
+            @rewardPi: r_pi[s] = R[s,pi(s)], shape ((MAX_CARS+1)^2,)
+        '''
+        carA, carB = np.indices(policy.shape)
+        moveA = self.moveA[carA, carB, policy]
+        moveB = self.moveB[carA, carB, policy]
+        tranPi = self.tranA[moveA][:, :, :, None] * self.tranB[moveB][:, :, None, :]
+        nState = policy.size
+        return tranPi.reshape(nState, nState), self.R[carA, carB, policy].reshape(nState)
+
+    
+    def mdp_tables(self):
         '''
-        calculate poisson pmf: 
-            p(n,lam) = exp(-lam)*lam^n/n!
-        also store those (n,lam) that have already been calculated, 
-        so that next time (n,lam) pair is queried, use table search 
+        the env in the layout of MDP.TabularMDP: (P, R, mask, gamma, shape), s = s[0]*(MAX_CARS+1)+s[1]
+            P[a] = P_pi of the policy "always a", see policy_model(); dense rows, stored sparse for the common layout
+            mask = self.feasible
         '''
-        key = n*10 + lam
-        if key not in self.poiTable.keys():
-            self.poiTable[key] = stat.poisson.pmf(n,lam)
-        return self.poiTable[key]
+        from scipy import sparse
+        shape = self.feasible.shape[:2]
+        P = [sparse.csr_matrix(self.policy_model(np.full(shape, a))[0]) for a in range(0, len(self.action))]
+        nState = shape[0]*shape[1]
+        return P, self.R.reshape(nState, -1), self.feasible.reshape(nState, -1), self.GAMMA, shape
     
        
     def transition(self, state, action, stateValue):
@@ -102,11 +198,13 @@ class CarRentalEnv:
         qValue -= self.CAR_MOVE_FEE*abs(action) 
 
         # DAY2 
-        # Car request can't exceeds the present car storage        
+        # Car request can't exceeds the present car storage, requests beyond storage are folded into carReq = storage
+        probReqTableA = self.truncated_pmf(numOfCarsLocA['MOVE'], self.CAR_REQUEST['A'])
+        probReqTableB = self.truncated_pmf(numOfCarsLocB['MOVE'], self.CAR_REQUEST['B'])
         for carReqA in range(0, numOfCarsLocA['MOVE']+1) :
             for carReqB in range(0, numOfCarsLocB['MOVE']+1) :    
-                probReqA = self.poisson_pmf(carReqA,self.CAR_REQUEST['A'])
-                probReqB = self.poisson_pmf(carReqB,self.CAR_REQUEST['B'])
+                probReqA = probReqTableA[carReqA]
+                probReqB = probReqTableB[carReqB]
 #                print('DAY2 CAR request: {}, {}, prob. is {}'. format(carReqA, carReqB, probReqA*probReqB))
                             
                 # After renting, the # of cars            
@@ -114,11 +212,13 @@ class CarRentalEnv:
                 numOfCarsLocB['Req'] = numOfCarsLocB['MOVE'] - carReqB
 #                print('After car renting, state is: {}, {}'. format(numOfCarsLocA['Req'], numOfCarsLocB['Req']))
 #                print()
-                # car return can't exceeds the maximum storage            
+                # car return can't exceeds the maximum storage, returns beyond it are folded into the full state
+                probRtnTableA = self.truncated_pmf(self.MAX_CARS-numOfCarsLocA['Req'], self.CAR_RETURN['A'])
+                probRtnTableB = self.truncated_pmf(self.MAX_CARS-numOfCarsLocB['Req'], self.CAR_RETURN['B'])
                 for carRtnA in range(0, self.MAX_CARS-numOfCarsLocA['Req']+1) :
                     for carRtnB in range(0, self.MAX_CARS-numOfCarsLocB['Req']+1) :
-                        probRtnA = self.poisson_pmf(carRtnA,self.CAR_RETURN['A'])
-                        probRtnB = self.poisson_pmf(carRtnB,self.CAR_RETURN['B'])
+                        probRtnA = probRtnTableA[carRtnA]
+                        probRtnB = probRtnTableB[carRtnB]
 #                        print('DAY2 CAR return: {}, {}, prob. is: {}'. format(carRtnA, carRtnB, probRtnA*probRtnB))    
                         
                         # Final car number at the end of day
@@ -0,0 +1,106 @@
+###
+import itertools
+import numpy as np
+try :
+    from Env.CarRentalBase import CarRentalBase
+except ImportError :        # run as a script: python Env/MultiCarRentalEnv.py
+    from CarRentalBase import CarRentalBase
+
+class MultiCarRentalEnv(CarRentalBase):
+    '''
+    Jack's car rental, N locations
+        car rental fee: $10/car
+        car moving fee: $2/car
+        max car moving: moveBudget cars/night in total
+        max car holding: maxCars[i] cars/(day,location i)
+        car request prob. per day: location i -> poisson(request[i],n)
+        car return prob. per day: location i -> poisson(ret[i],n)
+        state space: # of cars/(end of day, location), s[i] = [0,maxCars[i]]
+        action space: net # of cars moved into each location/night, d, sum(d) = 0, sum(d>0) <= moveBudget
+                      for 2 locations, d = [-a, a], a = # of cars moving from the 1st to the 2nd location
+        Reward: car rental fee - car moving fee
+    NOTE:
+        after moving, the locations are independent, so p(s'|s,a) = prod(tran[i][s[i]+d[i], s'[i]], i)
+        only the N per-location matrices are stored: O(N*C^2) instead of O(C^(2N))
+    '''
+
+    def __init__(self, maxCars=(20, 20), request=(3, 4), ret=(3, 2), moveBudget=5):
+        '''
+        Constructor
+        input param.:
+            @maxCars: max car holding of each location
+            @request: poisson rate of car request of each location
+            @ret: poisson rate of car return of each location
+            @moveBudget: max car moving per night in total
+        '''
+        if not(len(maxCars)==len(request)==len(ret)) :
+            raise ValueError('maxCars, request and ret must have one entry per location')
+
+        CarRentalBase.__init__(self, max(maxCars), moveBudget, enumerate(request), enumerate(ret))
+        self.LOC_MAX_CARS = list(maxCars)
+        self.N_LOC = len(maxCars)
+
+        # action space: net car flow into each location
+        flows = range(self.MAX_MOVE_CARS, -self.MAX_MOVE_CARS-1, -1)
+        self.action = np.array([d for d in itertools.product(flows, repeat=self.N_LOC)
+                                if sum(d)==0 and sum(max(x,0) for x in d)<=self.MAX_MOVE_CARS], dtype='int32')
+
+        # factored model, built once
+        self.build_model()
+
+
+    def build_model(self):
+        '''
+        precompute the factored MDP once:
+            self.tran: p(n'|n) of each location
+            self.move: flat index of the state after moving, [s, a], s = flat index of the state
+            self.feasible: action constraint, [s[0], ..., s[N-1], a]
+            self.R: r(s,a) = sum(r*p(s',r|s,a)) - CAR_MOVE_FEE*(# of moved cars), [s, a]
+        '''
+        self.stateShape = tuple(c+1 for c in self.LOC_MAX_CARS)
+        self.tran = []
+        moveReward = np.zeros(self.stateShape)
+        for i in range(0, self.N_LOC) :
+            tran, reward, _ = self.location_model(self.CAR_REQUEST[i], self.CAR_RETURN[i], self.LOC_MAX_CARS[i])
+            self.tran.append(tran)
+            shape = [1]*self.N_LOC
+            shape[i] = -1
+            moveReward = moveReward + reward.reshape(shape)     # rewards of independent locations add up
+
+        state = np.indices(self.stateShape).reshape(self.N_LOC, -1)         # (N, # of states)
+        move = state[:, :, None] + self.action.T[:, None, :]                # (N, # of states, # of actions)
+        cap = np.array(self.LOC_MAX_CARS).reshape(-1, 1, 1)
+        self.feasible = np.all((move>=0) & (move<=cap), axis=0).reshape(self.stateShape + (len(self.action),))
+        # infeasible actions are clipped, the solver masks them out with self.feasible
+        self.move = np.ravel_multi_index(tuple(np.clip(move, 0, cap)), self.stateShape).astype('int32')
+
+        moveFee = self.CAR_MOVE_FEE * np.clip(self.action, 0, None).sum(axis=1)
+        self.R = moveReward.ravel()[self.move] - moveFee
+
+
+    def q_values(self, stateValue):
+        '''
+        q(s,a) of all states and actions at once
+        input param.:
+            @stateValue: v(s), shape self.stateShape
+        output param.:
+            @qValue: q(s,a) = R[s,a] + gamma * sum(p(s'|s,a)*v(s'), s'), shape self.stateShape + (len(self.action),)
+                     entries with self.feasible==False are meaningless
+        NOTE:
+            sum(p(s'|s,a)*v(s'), s') is v contracted with tran[i] along each location axis, then gathered at the moved state
+        '''
+        moveValue = stateValue
+        for i in range(0, self.N_LOC) :
+            moveValue = np.moveaxis(np.tensordot(self.tran[i], moveValue, axes=([1], [i])), 0, i)
+        qValue = self.R + self.GAMMA*moveValue.ravel()[self.move]
+        return qValue.reshape(self.feasible.shape)
+
+
+
+if __name__ == "__main__" :
+    new = MultiCarRentalEnv(maxCars=(10, 10, 10), request=(3, 4, 2), ret=(3, 2, 4))
+    print('# of locations: {}, # of states: {}, # of actions: {}'. format(new.N_LOC, new.feasible[..., 0].size, len(new.action)))
+    stateValue = np.zeros(new.stateShape)
+    qValue = new.q_values(stateValue)
+    print(qValue[5, 5, 5][new.feasible[5, 5, 5]])
+
@@ -10,11 +10,147 @@ fixed policy: player sticks if the player's sum is 20 or 21, and otherwise hits.
 '''
 import Env.BlackJackEnv as env
 import numpy as np
+import json
+import os
+import time
 
 
 new = env.BlackJack()
 
-# state value init
+EPISODES = (10000, 500000)  # value surfaces after these # of episodes
+BATCH = 100000      # episodes per call of env.play_batch
+SEED = 17
+HEADLESS = os.environ.get('RL_HEADLESS', '0')=='1'   # write results as .npz/.json instead of plotting
 
+# state value init: v(s) of state [usable 'A', dealer's showing card - 1, player sum - 12]
+SHAPE = (2, 10, 10)
+policy = np.full(SHAPE, env.HIT, dtype='int8')
+policy[:, :, 20-12:] = env.STICK     # stick on 20, 21
 
 
+def state_index(state):
+    '''
+    flat index of [usable 'A', dealer's showing card (1-10), player sum (12-21)] in an array of shape SHAPE
+    '''
+    return np.ravel_multi_index((state[:, 0], state[:, 1]-1, state[:, 2]-12), SHAPE)
+
+
+def mc_prediction(policy, episodes, firstVisit=True, batch=BATCH, seed=SEED, checkpoints=()):
+    '''
+    Monte Carlo prediction: v(s) = average return following s
+        episodes are generated in batches by env.play_batch, returns are scattered into
+        preallocated sum/count arrays of shape SHAPE by np.bincount, so memory is O(batch)
+    input param.:
+        @policy: action table, shape SHAPE
+        @episodes: # of episodes
+        @firstVisit: True: first-visit MC, False: every-visit MC
+        @checkpoints: # of episodes after which a copy of v(s) is kept
+    output param.:
+        @value: v(s), shape SHAPE, 0 for unvisited states
+        @count: # of visits of each state
+        @snapshot: {# of episodes: v(s)} at the checkpoints
+    NOTE:
+        the player's sum only grows, except when an 'A'=11 turns to 1, so a state can't repeat in one game
+        and both methods give the same estimate here; the first-visit filter is kept for other policies/envs
+    '''
+    rng = np.random.default_rng(seed)
+    total = np.zeros(np.prod(SHAPE))
+    count = np.zeros(np.prod(SHAPE), dtype='int64')
+    snapshot = {}
+    checkpoints = sorted(checkpoints)
+    done = 0
+    while done<episodes :
+        n = min(batch, episodes-done, (checkpoints[0] if checkpoints else episodes)-done)     # stop at checkpoints
+        state, _, episode, reward = env.play_batch(policy, n, rng)
+        index = state_index(state)
+        if firstVisit :
+            # steps are in time order inside a game: np.unique keeps the first (game, state)
+            _, first = np.unique(episode.astype('int64')*np.prod(SHAPE) + index, return_index=True)
+            index, episode = index[first], episode[first]
+        total += np.bincount(index, weights=reward[episode], minlength=total.size)
+        count += np.bincount(index, minlength=count.size)
+        done += n
+        while checkpoints and checkpoints[0]<=done :
+            snapshot[checkpoints.pop(0)] = value_of(total, count)
+    return value_of(total, count), count.reshape(SHAPE), snapshot
+
+
+def value_of(total, count):
+    '''
+    sum of returns/# of visits, 0 for unvisited states
+    '''
+    return (total/np.maximum(count, 1)).reshape(SHAPE)
+
+
+def benchmark_shoe(episodes=10**6, decks=6, penetration=0.75, lanes=10**4, seed=SEED):
+    '''
+    episodes/s of env.play_batch under the Ex5.1 policy: infinite deck vs. lanes finite shoes,
+    and the player's average reward by true count (running count/decks left) of the shoe at his first decision
+    '''
+    rng = np.random.default_rng(seed)
+    start = time.perf_counter()
+    for _ in range(0, episodes//lanes) :
+        env.play_batch(policy, lanes, rng)
+    infinite = episodes/(time.perf_counter()-start)
+    
+    shoe = env.Shoe(decks, penetration, lanes, rng)
+    rewardSum = np.zeros(21)
+    games = np.zeros(21)
+    start = time.perf_counter()
+    for _ in range(0, episodes//lanes) :
+        shoe.new_round()                     # reshuffle first, as play_batch would, so left is the shoe dealt from
+        left = (shoe.size - shoe.pos)/52     # decks left before the round
+        state, _, episode, reward = env.play_batch(policy, lanes, rng, shoe=shoe)
+        first = np.unique(episode, return_index=True)[1]
+        trueCount = np.clip(np.round(state[first, 3]/left[episode[first]]), -10, 10).astype('int64') + 10
+        rewardSum += np.bincount(trueCount, weights=reward[episode[first]], minlength=21)
+        games += np.bincount(trueCount, minlength=21)
+    finite = episodes/(time.perf_counter()-start)
+    
+    print('infinite deck: {:.0f} episodes/s, {}-deck shoe: {:.0f} episodes/s, {} shuffles'. format(infinite, decks, finite, shoe.shuffles))
+    for tc in range(-4, 5) :
+        if games[tc+10]>0 :
+            print('true count {:+d}: {} games, average reward {:+.3f}'. format(tc, int(games[tc+10]), rewardSum[tc+10]/games[tc+10]))
+    return infinite, finite
+
+
+def valuePlot(snapshot, name='blackjack'):
+    '''
+    plot v(s) surfaces, usable 'A' and no usable 'A', of each snapshot,
+    or in HEADLESS mode, write them to <name>.npz and <name>.json
+    '''
+    if HEADLESS :
+        np.savez(name + '.npz', **{'value{}'. format(n): value for n, value in snapshot.items()})
+        with open(name + '.json', 'w') as f :
+            json.dump({str(n): value.tolist() for n, value in snapshot.items()}, f)
+    else :
+        import BlackJackReport
+        BlackJackReport.valuePlot(snapshot)
+
+
+def main():
+    for firstVisit in (True, False) :
+        start = time.perf_counter()
+        value, count, snapshot = mc_prediction(policy, max(EPISODES), firstVisit, checkpoints=EPISODES)
+        elapsed = time.perf_counter()-start
+        print('{} MC: {} episodes in {:.2f} s, {:.0f} episodes/s'. format(
+              'first-visit' if firstVisit else 'every-visit', max(EPISODES), elapsed, max(EPISODES)/elapsed))
+    print('v(s) after {} episodes, usable \'A\', player sum 21..12 (rows) x dealer A..10:'. format(max(EPISODES)))
+    print(np.round(value[1].T[::-1], 2))
+    # ground truth, without (usable 'A', 21): its MC estimate also averages the naturals
+    import BlackJackDP
+    exact, _, _ = BlackJackDP.solve(policy)
+    nonNatural = np.ones(SHAPE, dtype='bool')
+    nonNatural[1, :, 21-12] = False
+    for n, estimate in sorted(snapshot.items()) :
+        print('{} episodes: max |v_MC - v_DP| = {:.3f}'. format(n, np.max(np.abs(estimate-exact)[nonNatural])))
+    valuePlot(snapshot)
+    benchmark_shoe()
+    
+    if not HEADLESS :
+        import BlackJackReport
+        BlackJackReport.show()
+
+
+if __name__ == '__main__':
+    main()
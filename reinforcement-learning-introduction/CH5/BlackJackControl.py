@@ -0,0 +1,161 @@
+'''
+Ex5.3, Ex5.4: Monte Carlo control of BlackJack
+    MC-ES: exploring starts, greedy policy improvement
+    off-policy MC control: weighted importance sampling, behavior policy b = uniform random, target policy = greedy of Q
+both consume batches of env.play_batch; Q and counts are fixed arrays of shape (usable 'A', dealer's showing card, player sum, action)
+'''
+import Env.BlackJackEnv as env
+import numpy as np
+import time
+from BlackJack import SHAPE, SEED, HEADLESS, state_index
+
+EPISODES = 5*10**6
+BATCH = 100000      # episodes per batch, the policy is improved after each batch
+CHECKPOINTS = (10**4, 10**5, 10**6, 5*10**6)
+BEHAVIOR = 0.5      # b(STICK|s)
+
+
+def sa_index(state, action):
+    '''
+    flat index of (state, action) in an array of shape SHAPE + (2,)
+    '''
+    return state_index(state)*2 + action
+
+
+def greedy(sumG, count, policy):
+    '''
+    greedy policy of Q = sumG/count; a state keeps its action until both actions have been tried
+    '''
+    qValue = (sumG/np.maximum(count, 1e-300)).reshape(SHAPE + (2,))
+    tried = np.all(count.reshape(SHAPE + (2,))>0, axis=-1)
+    return np.where(tried, np.argmax(qValue, axis=-1), policy).astype('int8')
+
+
+def progress(history, episodes, start, policy, lastPolicy, reference, verbose):
+    '''
+    record convergence at a checkpoint: episodes, seconds, # of changed actions since the last checkpoint,
+    # of actions equal to the reference policy
+    '''
+    record = (episodes, time.perf_counter()-start, int(np.sum(policy!=lastPolicy)),
+              None if reference is None else int(np.sum(policy==reference)))
+    history.append(record)
+    if verbose :
+        print('{:>9} episodes, {:7.2f} s, {:3} actions changed{}'. format(
+              record[0], record[1], record[2], '' if reference is None else ', {}/200 as reference'. format(record[3])))
+
+
+def mc_es(episodes=EPISODES, batch=BATCH, seed=SEED, checkpoints=CHECKPOINTS, reference=None, verbose=True):
+    '''
+    Monte Carlo ES: Q(s,a) = average return following (s,a), pi(s) = argmax(Q(s,a), a) after each batch
+    input param.:
+        @episodes: # of episodes
+        @batch: episodes per batch
+        @checkpoints: # of episodes at which convergence is recorded
+        @reference: policy to compare with, e.g. the DP optimum, or None
+    output param.:
+        @qValue: Q(s,a), shape SHAPE + (2,)
+        @policy: greedy policy, shape SHAPE
+        @history: [(episodes, seconds, # of changed actions, # of actions equal to reference)]
+    NOTE:
+        a state can't repeat in one game (see BlackJack.mc_prediction), so first-visit = every-visit
+    '''
+    rng = np.random.default_rng(seed)
+    sumG = np.zeros(np.prod(SHAPE)*2)
+    count = np.zeros(np.prod(SHAPE)*2)
+    policy = np.full(SHAPE, env.HIT, dtype='int8')
+    policy[:, :, 20-12:] = env.STICK     # initial policy of Ex5.1
+    lastPolicy = policy.copy()
+    checkpoints = sorted(checkpoints)
+    history = []
+    start = time.perf_counter()
+    done = 0
+    while done<episodes :
+        n = min(batch, episodes-done, (checkpoints[0] if checkpoints else episodes)-done)     # stop at checkpoints
+        state, action, episode, reward = env.play_batch(policy, n, rng, explore=True)
+        index = sa_index(state, action)
+        sumG += np.bincount(index, weights=reward[episode], minlength=sumG.size)
+        count += np.bincount(index, minlength=count.size)
+        policy = greedy(sumG, count, policy)
+        done += n
+        while checkpoints and checkpoints[0]<=done :
+            progress(history, checkpoints.pop(0), start, policy, lastPolicy, reference, verbose)
+            lastPolicy = policy.copy()
+    return (sumG/np.maximum(count, 1)).reshape(SHAPE + (2,)), policy, history
+
+
+def off_policy(episodes=EPISODES, batch=BATCH, seed=SEED, checkpoints=CHECKPOINTS, reference=None, verbose=True, behavior=BEHAVIOR):
+    '''
+    off-policy MC control, weighted importance sampling: Q(s,a) = sum(W*G)/sum(W) = sum(W*G)/C(s,a)
+        the step t of a game of T steps is used iff all later actions are the target's,
+        W = prod(pi(A_k|S_k)/b(A_k|S_k), k = t+1..T-1) = (1/b)^(T-1-t), as the backward loop of the book that breaks
+        at the first non-greedy action; the target policy is fixed within a batch
+    input param.:
+        @behavior: b(STICK|s) of every state
+        see mc_es()
+    output param.:
+        see mc_es()
+    '''
+    rng = np.random.default_rng(seed)
+    bPolicy = np.full(SHAPE, behavior)
+    sumWG = np.zeros(np.prod(SHAPE)*2)
+    C = np.zeros(np.prod(SHAPE)*2)
+    policy = np.full(SHAPE, env.HIT, dtype='int8')
+    policy[:, :, 20-12:] = env.STICK
+    lastPolicy = policy.copy()
+    checkpoints = sorted(checkpoints)
+    history = []
+    start = time.perf_counter()
+    done = 0
+    while done<episodes :
+        n = min(batch, episodes-done, (checkpoints[0] if checkpoints else episodes)-done)     # stop at checkpoints
+        state, action, episode, reward = env.play_batch(bPolicy, n, rng)
+        # steps of each game in time order, games in a row
+        order = np.argsort(episode, kind='stable')
+        state, action, episode = state[order], action[order], episode[order]
+        position = np.arange(len(episode))
+        end = np.searchsorted(episode, episode, side='right') - 1      # last step of the game
+        miss = np.cumsum(action!=policy[state[:, 0], state[:, 1]-1, state[:, 2]-12])
+        later = miss[end] - miss            # # of non-greedy actions after step t
+        bProb = np.where(action==env.STICK, behavior, 1-behavior)
+        # W = prod(1/b(A_k|S_k), k>t): cumulative log from the end of each game
+        logB = np.cumsum(np.log(bProb))
+        W = np.where(later==0, np.exp(logB[position] - logB[end]), 0)
+        index = sa_index(state, action)
+        sumWG += np.bincount(index, weights=W*reward[episode], minlength=sumWG.size)
+        C += np.bincount(index, weights=W, minlength=C.size)
+        policy = greedy(sumWG, C, policy)
+        done += n
+        while checkpoints and checkpoints[0]<=done :
+            progress(history, checkpoints.pop(0), start, policy, lastPolicy, reference, verbose)
+            lastPolicy = policy.copy()
+    return (sumWG/np.maximum(C, 1e-300)).reshape(SHAPE + (2,)), policy, history
+
+
+def policyShow(policy):
+    '''
+    print the policy, player sum 21..12 (rows) x dealer A..10, 'S' stick, 'H' hit
+    '''
+    for ace in (1, 0) :
+        print('usable \'A\'' if ace else 'no usable \'A\'')
+        for total in range(9, -1, -1) :
+            print('{:>3} '. format(total+12) + ' '.join('S' if a==env.STICK else 'H' for a in policy[ace, :, total]))
+
+
+def main():
+    import BlackJackDP
+    _, _, optPolicy = BlackJackDP.solve()
+    print('MC-ES:')
+    _, esPolicy, _ = mc_es(reference=optPolicy)
+    policyShow(esPolicy)
+    print('off-policy MC, weighted importance sampling:')
+    _, offPolicy, _ = off_policy(reference=optPolicy)
+    policyShow(offPolicy)
+    
+    if not HEADLESS :
+        import BlackJackReport
+        BlackJackReport.policyPlot({'MC-ES': esPolicy, 'off-policy MC': offPolicy, 'DP': optPolicy})
+        BlackJackReport.show()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+'''
+exact dynamic programming for BlackJack: infinite deck, so every card code has p = 1/13
+    dealer table: distribution of the dealer's final sum {17, ..., 21, bust} given the showing card, computed once
+    hit table: p(sum', usable 'A'' | sum, usable 'A') of one card, with bust as an extra state
+    stick: q(s,STICK) = p(dealer bust) + p(dealer < sum) - p(dealer > sum)
+    hit: q(s,HIT) = sum(p(s'|s)*v(s'), s'), v(bust) = -1
+the player's states form a DAG (the sum only grows, except an 'A'=11 turning to 1 once), so the sweeps are exact after <= 20 steps
+'''
+import Env.BlackJackEnv as env
+import numpy as np
+import time
+from BlackJack import SHAPE
+
+FINAL = np.arange(17, 22)       # dealer's final sums, bust is the last column of the dealer table
+dealerTable = None              # see dealer_table()
+
+
+def dealer_table():
+    '''
+    p(dealer's final sum | showing card), shape (10, 6): rows A..10, columns 17..21, bust
+        computed once by propagating the probability mass of the dealer's (sum, usable 'A') hands until all stand
+    '''
+    global dealerTable
+    if dealerTable is None :
+        dealerTable = np.zeros((10, len(FINAL)+1))
+        code = np.arange(13)
+        for show in range(1, 11) :
+            card = env.ACE if show==1 else show-2
+            total, usable = env.add_card(np.zeros(1, dtype='int64'), np.zeros(1, dtype='bool'), np.array([card]))
+            mass = np.ones(1)
+            # hands below 17 draw; every draw raises the sum or uses up the 'A'=11, so this ends in <= 17 rounds
+            while len(mass)>0 :
+                draw = total<17
+                stand = ~draw
+                dealerTable[show-1, :-1] += np.bincount(np.clip(total[stand]-17, 0, len(FINAL)), weights=mass[stand], minlength=len(FINAL)+1)[:-1]
+                dealerTable[show-1, -1] += mass[stand & (total>21)].sum()
+                total, usable = env.add_card(np.repeat(total[draw], 13), np.repeat(usable[draw], 13), np.tile(code, np.count_nonzero(draw)))
+                mass = np.repeat(mass[draw], 13)/13
+                # merge equal hands
+                key, inverse = np.unique(total*2 + usable, return_inverse=True)
+                mass = np.bincount(inverse, weights=mass)
+                total, usable = key//2, (key%2).astype('bool')
+    return dealerTable
+
+
+def stick_value():
+    '''
+    q(s,STICK), shape SHAPE
+    '''
+    table = dealer_table()
+    total = np.arange(12, 22)
+    win = table[:, -1][:, None] + np.sum(table[:, None, :-1]*(FINAL[None, None, :]<total[None, :, None]), axis=-1)
+    lose = np.sum(table[:, None, :-1]*(FINAL[None, None, :]>total[None, :, None]), axis=-1)
+    return np.broadcast_to(win-lose, SHAPE).copy()
+
+
+def hit_table():
+    '''
+    p(s'|s) of one card, shape (20, 21): s = usable 'A'*10 + sum-12, s' the same or 20 = bust
+    '''
+    state = np.arange(20)
+    usable = state>=10
+    total = state%10 + 12
+    nextTotal, nextUsable = env.add_card(np.repeat(total, 13), np.repeat(usable, 13), np.tile(np.arange(13), 20))
+    nextState = np.where(nextTotal>21, 20, nextUsable*10 + np.minimum(nextTotal, 21)-12)
+    table = np.zeros((20, 21))
+    np.add.at(table, (np.repeat(state, 13), nextState), 1/13)
+    return table
+
+
+def solve(policy=None):
+    '''
+    v(s), q(s,a) and the greedy policy, exactly
+    input param.:
+        @policy: None: optimal control, v(s) = max(q(s,a), a)
+                 action table of shape SHAPE: policy evaluation, v(s) = q(s,policy(s))
+    output param.:
+        @value: v(s), shape SHAPE
+        @qValue: q(s,a), shape SHAPE + (2,)
+        @optPolicy: argmax(q(s,a), a), STICK on ties
+    NOTE:
+        these are values of non-natural hands: the MC estimates of (usable 'A', 21) also average the naturals
+    '''
+    stick = stick_value()
+    table = hit_table()
+    value = np.zeros(SHAPE)
+    qValue = np.zeros(SHAPE + (2,))
+    qValue[..., env.STICK] = stick
+    for _ in range(0,21) :
+        # v of the 20 player states x 10 showing cards, bust = -1
+        nextValue = np.concatenate([value.transpose(0, 2, 1).reshape(20, 10), -np.ones((1, 10))])
+        qValue[..., env.HIT] = (table @ nextValue).reshape(2, 10, 10).transpose(0, 2, 1)
+        if policy is None :
+            newValue = qValue.max(axis=-1)
+        else :
+            newValue = np.take_along_axis(qValue, policy[..., None].astype('int64'), axis=-1)[..., 0]
+        if np.array_equal(newValue, value) :
+            break
+        value = newValue
+    optPolicy = np.where(qValue[..., env.STICK]>=qValue[..., env.HIT], env.STICK, env.HIT).astype('int8')
+    return value, qValue, optPolicy
+
+
+def main():
+    start = time.perf_counter()
+    value, _, optPolicy = solve()
+    elapsed = time.perf_counter()-start
+    print('exact DP: {:.1f} ms'. format(elapsed*1e3))
+    print('dealer\'s final sum 17..21, bust | showing A..10:')
+    print(np.round(dealer_table(), 4))
+    import BlackJackControl
+    BlackJackControl.policyShow(optPolicy)
+    print('v(s) of the optimal policy, usable \'A\', player sum 21..12 (rows) x dealer A..10:')
+    print(np.round(value[1].T[::-1], 3))
+
+
+if __name__ == '__main__':
+    main()
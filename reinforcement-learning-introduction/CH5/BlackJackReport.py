@@ -0,0 +1,39 @@
+'''
+plotting of the BlackJack results; imported only when a plot is requested, 
+so that BlackJack starts without matplotlib (see HEADLESS in BlackJack)
+'''
+import numpy as np
+import matplotlib.pyplot as plt
+
+def valuePlot(snapshot):
+    '''
+    v(s) surfaces over dealer's showing card x player sum, usable 'A' and no usable 'A', of each # of episodes
+        snapshot: {# of episodes: v(s) of shape (2, 10, 10)}
+    '''
+    dealer, player = np.meshgrid(np.arange(1, 11), np.arange(12, 22), indexing='ij')
+    fig = plt.figure(figsize=(5*len(snapshot), 8))
+    for col, (episodes, value) in enumerate(sorted(snapshot.items())) :
+        for row, ace in enumerate((1, 0)) :
+            ax = fig.add_subplot(2, len(snapshot), row*len(snapshot)+col+1, projection='3d')
+            ax.plot_surface(dealer, player, value[ace], cmap='viridis')
+            ax.set_title('{} episodes, {}'. format(episodes, 'usable ace' if ace else 'no usable ace'))
+            ax.set_xlabel('Dealer showing')
+            ax.set_ylabel('Player sum')
+            ax.set_zlim(-1, 1)
+
+def policyPlot(policies):
+    '''
+    policy maps, player sum x dealer's showing card, usable 'A' and no usable 'A', of each method
+        policies: {name: policy of shape (2, 10, 10)}
+    '''
+    fig, axes = plt.subplots(2, len(policies), figsize=(4*len(policies), 8), squeeze=False)
+    for col, (name, policy) in enumerate(policies.items()) :
+        for row, ace in enumerate((1, 0)) :
+            ax = axes[row, col]
+            ax.imshow(policy[ace].T, origin='lower', extent=(0.5, 10.5, 11.5, 21.5), cmap='coolwarm', vmin=0, vmax=1)
+            ax.set_title('{}, {}'. format(name, 'usable ace' if ace else 'no usable ace'))
+            ax.set_xlabel('Dealer showing')
+            ax.set_ylabel('Player sum (red: stick)')
+
+def show():
+    plt.show()
@@ -1,6 +1,78 @@
 ###
 import numpy as np
 
+CARD = ['2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K', 'A']     # card code i -> CARD[i]
+CARD_VALUE = np.array([2, 3, 4, 5, 6, 7, 8, 9, 10, 10, 10, 10, 1], dtype='int8')    # A=1/11, face cards = 10
+ACE = 12        # card code of 'A'
+HIT, STICK = 0, 1
+HI_LO = np.array([1, 1, 1, 1, 1, 0, 0, 0, -1, -1, -1, -1, -1], dtype='int8')    # running count: 2-6 +1, 7-9 0, 10-A -1
+MAX_ROUND = 26  # cards kept behind the reshuffle point: more than one game can use
+
+
+class Shoe:
+    '''
+    finite shoes of several decks, for many games at once: one shoe per lane, each lane plays one game per round
+        each shoe is a preshuffled int8 row of card codes, dealt by a pointer; no per-card list operations
+        a shoe past its penetration is reshuffled between games, so the shuffle is amortized over the whole shoe
+        the running Hi-Lo count of the cards seen in each shoe is kept, the dealer's hidden card counts when the game ends
+    '''
+    __slots__ = ('decks', 'size', 'cut', 'lanes', 'rng', 'cards', 'pos', 'count', 'shuffles')
+    
+    def __init__(self, decks=6, penetration=0.75, lanes=1, rng=None):
+        '''
+        Constructor
+        input param.:
+            @decks: # of decks per shoe
+            @penetration: fraction of the shoe dealt before the reshuffle
+            @lanes: # of shoes, i.e. games per round
+            @rng: np.random.Generator
+        '''
+        self.decks = decks
+        self.size = 52*decks
+        self.cut = min(int(penetration*self.size), self.size-MAX_ROUND)
+        if self.cut<=0 :
+            raise ValueError('the shoe is too small for the penetration')
+        self.lanes = lanes
+        self.rng = np.random.default_rng() if rng is None else rng
+        self.cards = np.tile(np.repeat(np.arange(13, dtype='int8'), 4*decks), (lanes, 1))
+        self.pos = np.zeros(lanes, dtype='int64')
+        self.count = np.zeros(lanes, dtype='int64')
+        self.shuffles = 0
+        self.shuffle(np.arange(lanes))
+    
+    def shuffle(self, lanes):
+        '''
+        reshuffle the shoes of lanes
+        '''
+        self.cards[lanes] = self.rng.permuted(self.cards[lanes], axis=1)
+        self.pos[lanes] = 0
+        self.count[lanes] = 0
+        self.shuffles += len(lanes)
+    
+    def new_round(self):
+        '''
+        reshuffle the shoes past the cut card, before the next game
+        '''
+        cut = np.nonzero(self.pos>=self.cut)[0]
+        if len(cut)>0 :
+            self.shuffle(cut)
+    
+    def deal(self, lanes, seen=True):
+        '''
+        next card of the shoes of lanes
+        '''
+        card = self.cards[lanes, self.pos[lanes]]
+        self.pos[lanes] += 1
+        if seen :
+            self.count[lanes] += HI_LO[card]
+        return card
+    
+    def reveal(self, lanes, card):
+        '''
+        count a card dealt with seen=False
+        '''
+        self.count[lanes] += HI_LO[card]
+
 
 class BlackJack:
     '''
@@ -29,14 +101,26 @@ class BlackJack:
         If the player/dealer holds multiple 'A', there is at most one card 'A' = 11, because the cards sum must not exceed 21, or he'll go bust and lose the game. 
         Therefore, each time player/dealer gets a 'A', it first is treated as 11, and AceFlag=true. If the cards sum > 21, then in order to prevent going bust, 'A' will be resigned as 1, and re-calculate
         cards sum.
+        cards are integer codes, see CARD; nothing is printed unless verbose
+        for many episodes at once, use play_batch()
     '''
-    def __init__(self):
+    __slots__ = ('action', 'cardValue', 'card', 'playerCards', 'dealerCards', 'CardSum', 'Ace11Flag', 'reward', 'gameEnd',
+                 'showCard', 'verbose', 'rng', 'shoe')
+    
+    def __init__(self, verbose=False, rng=None, shoe=None):
         '''
         Constructor
+        input param.:
+            @verbose: print the game
+            @rng: np.random.Generator, a fresh default_rng() if None
+            @shoe: Shoe of one lane, kept across games; None for the infinite deck
         '''
+        self.verbose = verbose
+        self.rng = np.random.default_rng() if rng is None else rng
+        self.shoe = shoe
         self.action = ['hit', 'stick']
-        self.cardValue = {'2':2, '3':3, '4':4, '5':5, '6':6, '7':7, '8':8, '9':9, '10':10, 'J':10, 'Q':10, 'K':10, 'A': 1}      # A=1/11, face cards = 10
-        self.card = list(self.cardValue.keys())
+        self.cardValue = CARD_VALUE
+        self.card = CARD
         self.playerCards = []
         self.dealerCards = []
         self.CardSum = {'player':0, 'dealer': 0}    
@@ -45,47 +129,75 @@ class BlackJack:
         self.gameEnd = False    # game over
         
         # initial 2 cards
-        for _ in range(0,2) :
+        if self.shoe is None :
+            idx = self.rng.integers(0, 13, 4)
+        else :
+            self.shoe.new_round()
+            idx = [self.draw(), self.draw(), self.draw(), self.draw(seen=False)]     # player, dealer, player, dealer's hidden card
+        for i in range(0,2) :
             # player
-            idx = np.random.randint(0,13)
-            self.playerCards.append(self.card[idx])
-            self.card_sum(self.card[idx], 'player')
+            self.playerCards.append(int(idx[2*i]))
+            self.card_sum(idx[2*i], 'player')
             # dealer
-            idx = np.random.randint(0,13)
-            self.dealerCards.append(self.card[idx])
-            self.card_sum(self.card[idx], 'dealer')
+            self.dealerCards.append(int(idx[2*i+1]))
+            self.card_sum(idx[2*i+1], 'dealer')
         
         # dealer's showing card
         self.showCard = self.dealerCards[0]
 
         # natural? 
         if self.CardSum['player'] == 21:
-            print()    
-            print('Player is NATURAL!!')
             if self.CardSum['dealer'] != 21:
-                print('Player Win!!')
                 self.reward = 1
             else :
-                print('Draw!!')
                 self.reward = 0
             self.gameEnd = True
+            self.reveal()
             
-            print('Player initial cars: ', self.playerCards)  
-            print('Player Ace11Flag: ', self.Ace11Flag['player'])    
-            print('Player CardSum: ', self.CardSum['player'])
-                  
-            print('Dealer initial cars: ', self.dealerCards)
-            print('Dealer Ace11Flag: ', self.Ace11Flag['dealer'])
-            print('Dealer CardSum: ', self.CardSum['dealer'])      
-                          
-            print('Game Over!!')
+            if self.verbose :
+                print()    
+                print('Player is NATURAL!!')
+                print('Player Win!!' if self.reward==1 else 'Draw!!')
+                print('Player initial cars: ', self.names(self.playerCards))  
+                print('Player Ace11Flag: ', self.Ace11Flag['player'])    
+                print('Player CardSum: ', self.CardSum['player'])
+                      
+                print('Dealer initial cars: ', self.names(self.dealerCards))
+                print('Dealer Ace11Flag: ', self.Ace11Flag['dealer'])
+                print('Dealer CardSum: ', self.CardSum['dealer'])      
+                              
+                print('Game Over!!')
+        
+        
+    def draw(self, seen=True):
+        '''
+        one card code, from the shoe or the infinite deck
+        '''
+        if self.shoe is None :
+            return self.rng.integers(0,13)
+        return int(self.shoe.deal(0, seen))
+        
+        
+    def reveal(self):
+        '''
+        count the dealer's hidden card at the end of a shoe game
+        '''
+        if self.shoe is not None :
+            self.shoe.reveal(0, self.dealerCards[1])
+        
+        
+    def names(self, cards):
+        '''
+        card codes -> card names
+        '''
+        return [self.card[c] for c in cards]
         
         
     def card_sum(self, card, who):
         '''
         calculate player/dealer cards sum
         input param.:
-            card: card element
+            card: card code
                 if card=='A' and AceFlag==False
                     'A' = 11  
                     sum += 11
@@ -102,26 +214,26 @@ class BlackJack:
                         sum -= 10
             who: player, or dealer    
         '''
-        if card=='A' and self.Ace11Flag[who]==False :
+        if card==ACE and self.Ace11Flag[who]==False :
             self.CardSum[who] += 11 
             self.Ace11Flag[who] = True
             # prevent going bust, set 'A'=1
             if self.CardSum[who]>21 :
                 self.CardSum[who] -= 10
                 self.Ace11Flag[who] = False
-        elif card=='A' and self.Ace11Flag[who]==True :
+        elif card==ACE and self.Ace11Flag[who]==True :
             self.CardSum[who] += 1 
             # prevent exception: stupid player makes a stupid 'hit' decision when he got 21
             if self.CardSum[who]>21 :
                 self.CardSum[who] -= 10
                 self.Ace11Flag[who] = False
         elif self.Ace11Flag[who]==True :
-            self.CardSum[who] += self.cardValue[card]
+            self.CardSum[who] += int(self.cardValue[card])
             if self.CardSum[who]>21 :
                 self.CardSum[who] -= 10
                 self.Ace11Flag[who] = False
         else: 
-            self.CardSum[who] += self.cardValue[card]       
+            self.CardSum[who] += int(self.cardValue[card])       
                 
                 
     def one_deal(self, playerAction):
@@ -131,51 +243,48 @@ class BlackJack:
             dealing cards, player first
         if playerAction == stick
             dealer's decision
+        NOTE:
+            only the first two cards make a natural; a player reaching 21 by hitting goes on, and sticks by his policy
         '''
         if self.CardSum['player']>21 :
             raise ValueError('NO MORE DEAL; Player has already gone bust!!')
-        print('Player action: ', action)    
+        if self.verbose :
+            print('Player action: ', playerAction)    
         # hit action
         if playerAction==self.action[0] :
             # player first
-            idx = np.random.randint(0,13)
-            self.playerCards.append(self.card[idx])
+            idx = self.draw()
+            self.playerCards.append(int(idx))
             
             # cal card sum
-            self.card_sum(self.card[idx], 'player')
+            self.card_sum(idx, 'player')
             
             # check state
             # bust
             if self.CardSum['player']>21 :
-                print('player goes bust')
+                if self.verbose :
+                    print('player goes bust')
                 self.gameEnd = True
                 self.reward = -1
-            # natural
-            elif self.CardSum['player']==21 :
-                print('Player is NATURAL!!')
-                if self.CardSum['dealer'] != 21:
-                    print('Player Win!!')
-                    self.reward = 1
-                else :
-                    print('Draw!!')
-                    self.reward = 0
-                self.gameEnd = True 
+                self.reveal()
             # continue        
             else :
                 self.gameEnd = False
         # stick action
         else :
             # dealer's turn
-            print('Dealer\'s turn')
+            if self.verbose :
+                print('Dealer\'s turn')
             while self.gameEnd==False :
                 # hit
                 if self.CardSum['dealer']<17 :
-                    print('Dealer hit')
+                    if self.verbose :
+                        print('Dealer hit')
                     # deal
-                    idx = np.random.randint(0,13)
-                    self.dealerCards.append(self.card[idx])
+                    idx = self.draw()
+                    self.dealerCards.append(int(idx))
                     # cal cards sum
-                    self.card_sum(self.card[idx], 'dealer')
+                    self.card_sum(idx, 'dealer')
                     
                     self.gameEnd = False
                 # stick, and judge who win
@@ -183,21 +292,176 @@ class BlackJack:
                     self.gameEnd = True
                     # dealer goes bust, player win
                     if self.CardSum['dealer'] > 21 :
-                        print('Dealer goes bust')
+                        msg = 'Dealer goes bust'
                         self.reward = 1
                     # dealer > player, player lose
                     elif self.CardSum['dealer'] > self.CardSum['player'] :
-                        print('Dealer cars sum > player\'s')
+                        msg = 'Dealer cars sum > player\'s'
                         self.reward = -1
                     # dealer == player, draw
                     elif self.CardSum['dealer'] == self.CardSum['player'] :
-                        print('Dealer cars sum = player\'s')
+                        msg = 'Dealer cars sum = player\'s'
                         self.reward = 0
                     # dealer < player, player win    
-                    elif self.CardSum['dealer'] < self.CardSum['player'] :
-                        print('Dealer cars sum < player\'s')
+                    else :
+                        msg = 'Dealer cars sum < player\'s'
                         self.reward = 1       
-                       
+                    self.reveal()
+                    if self.verbose :
+                        print(msg)
+    
+    
+def add_card(total, usable, card):
+    '''
+    vectorized card_sum(): add card codes to many hands at once
+    input param.:
+        @total: cards sum, int array
+        @usable: Ace11Flag, bool array
+        @card: card codes
+    output param.:
+        @total, @usable: new arrays
+    NOTE:
+        an 'A' counts 11 if the hand has no 'A'=11 yet; then, if sum>21 and an 'A'=11 is held, it becomes 1
+    '''
+    ace = card==ACE
+    total = total + CARD_VALUE[card] + 10*(ace & ~usable)
+    usable = usable | ace
+    soften = (total>21) & usable
+    return total - 10*soften, usable & ~soften
+
+
+def dealer_play(total, usable, draw, game):
+    '''
+    dealer's fixed strategy for many hands at once: hit while sum<17
+    input param.:
+        @draw: draw(game) -> one card code for each game in game
+        @game: game index of each hand
+    output param.:
+        @total: final cards sum, > 21 if bust
+    '''
+    total = total.copy()
+    usable = usable.copy()
+    active = np.nonzero(total<17)[0]
+    while len(active)>0 :
+        total[active], usable[active] = add_card(total[active], usable[active], draw(game[active]))
+        active = active[total[active]<17]
+    return total
+
+
+def play_batch(policy, episodes, rng=None, explore=False, shoe=None):
+    '''
+    play many games at once under a policy table
+        a hand below 12 always hits and is no state (see Ex5.1); only the first two cards make a natural
+    input param.:
+        @policy: [usable 'A', dealer's showing card - 1, player sum - 12], shape (2, 10, 10),
+                 int: action of each state, HIT=0/STICK=1
+                 float: p(STICK) of each state, e.g. a behavior policy
+        @episodes: # of games
+        @rng: np.random.Generator
+        @explore: exploring starts, the first state is uniform over all 200 states and the first action is uniform,
+                  no natural
+        @shoe: Shoe with episodes lanes, one game per shoe; None for the infinite deck
+    output param.:
+        @state: [usable 'A', dealer's showing card (1-10), player sum (12-21)] of every step, int8, shape (# of steps, 3)
+                with a shoe, one more column: running count before the action, and int16
+        @action: HIT/STICK of every step, int8, a natural is recorded as one STICK step
+        @episode: game index of every step, int32
+        @reward: final reward of every game, int8, shape (episodes,); undiscounted, so the return of each step is reward[episode]
+    NOTE:
+        steps are ordered by time, then by game; the steps of a game are in time order
+    '''
+    if rng is None :
+        rng = np.random.default_rng()
+    game = np.arange(episodes)
+    if shoe is None :
+        draw = lambda game : rng.integers(0, 13, len(game))
+        card = rng.integers(0, 13, (4, episodes))
+    else :
+        if explore or shoe.lanes!=episodes :
+            raise ValueError('a shoe plays one game per lane and no exploring starts')
+        draw = shoe.deal
+        shoe.new_round()
+        card = np.empty((4, episodes), dtype='int64')
+        card[0], card[2], card[1] = draw(game), draw(game), draw(game)      # player, dealer, player
+        card[3] = shoe.deal(game, seen=False)                               # dealer's hidden card
+    zero = np.zeros(episodes, dtype='int64')
+    noAce = np.zeros(episodes, dtype='bool')
+    player, playerAce = add_card(*add_card(zero, noAce, card[0]), card[1])
+    dealer, dealerAce = add_card(*add_card(zero, noAce, card[2]), card[3])
+    show = CARD_VALUE[card[2]]
+    
+    if explore :
+        playerAce = rng.integers(0, 2, episodes).astype('bool')
+        player = rng.integers(12, 22, episodes)
+        show = rng.integers(1, 11, episodes).astype('int8')
+        card[2] = np.where(show==1, ACE, show-2)      # a showing 10 is the card '10'
+        dealer, dealerAce = add_card(*add_card(zero, noAce, card[2]), card[3])
+        firstAction = rng.integers(0, 2, episodes).astype('int8')
+    
+    # natural? 
+    reward = np.zeros(episodes, dtype='int8')
+    natural = (player==21) & (not explore)
+    reward[natural] = np.where(dealer[natural]==21, 0, 1)
+    
+    # a hand below 12 can't go bust by one card: hit
+    low = np.nonzero(player<12)[0]
+    while len(low)>0 :
+        player[low], playerAce[low] = add_card(player[low], playerAce[low], draw(low))
+        low = low[player[low]<12]
+    
+    # player's turn, all unfinished games one step at a time
+    index, ace, total, act, count = [], [], [], [], []
+    active = np.nonzero(natural)[0]
+    index.append(active)
+    ace.append(playerAce[active])
+    total.append(player[active])
+    act.append(np.full(len(active), STICK, dtype='int8'))
+    if shoe is not None :
+        count.append(shoe.count[active])
+    stick = []
+    active = np.nonzero(~natural)[0]
+    first = True
+    while len(active)>0 :
+        state = (playerAce[active].astype('int8'), show[active]-1, player[active]-12)
+        if explore and first :
+            action = firstAction[active]
+        elif policy.dtype.kind=='f' :
+            action = (rng.random(len(active)) < policy[state]).astype('int8')
+        else :
+            action = policy[state].astype('int8')
+        first = False
+        index.append(active)
+        ace.append(playerAce[active])
+        total.append(player[active])
+        act.append(action)
+        if shoe is not None :
+            count.append(shoe.count[active])
+        stick.append(active[action==STICK])
+        hit = active[action==HIT]
+        player[hit], playerAce[hit] = add_card(player[hit], playerAce[hit], draw(hit))
+        # bust
+        reward[hit[player[hit]>21]] = -1
+        active = hit[player[hit]<=21]
+    
+    # dealer's turn
+    stick = np.concatenate(stick) if stick else np.zeros(0, dtype='int64')
+    final = dealer_play(dealer[stick], dealerAce[stick], draw, stick)
+    reward[stick] = np.where(final>21, 1, np.sign(player[stick]-final))
+    if shoe is not None :
+        shoe.reveal(game, card[3])
+    
+    # flat step arrays
+    episode = np.concatenate(index).astype('int32')
+    if shoe is None :
+        state = np.empty((len(episode), 3), dtype='int8')
+    else :
+        state = np.empty((len(episode), 4), dtype='int16')
+        state[:, 3] = np.concatenate(count)
+    state[:, 0] = np.concatenate(ace)
+    state[:, 1] = show[episode]
+    state[:, 2] = np.concatenate(total)
+    return state, np.concatenate(act), episode, reward
+    
                     
 if __name__=='__main__' :
     '''
@@ -223,9 +487,9 @@ if __name__=='__main__' :
     player's policy: if sum<20, then hit; otherwise, stick 
     '''            
     # init
-    new = BlackJack()
-    print('Dealer initial cars: ', new.dealerCards)
-    print('Player initial cars: ', new.playerCards)
+    new = BlackJack(verbose=True)
+    print('Dealer initial cars: ', new.names(new.dealerCards))
+    print('Player initial cars: ', new.names(new.playerCards))
     
     ite = 0
     while new.gameEnd==False :
@@ -241,11 +505,11 @@ if __name__=='__main__' :
             action = new.action[1]
             new.one_deal(action)
     print()        
-    print('Dealer cars: ', new.dealerCards)
+    print('Dealer cars: ', new.names(new.dealerCards))
     print('Dealer AceFlag: ', new.Ace11Flag['dealer'])
     print('Dealer CardSum: ', new.CardSum['dealer'])    
      
-    print('Player cars: ', new.playerCards)
+    print('Player cars: ', new.names(new.playerCards))
     print('Player Ace11Flag: ', new.Ace11Flag['player'])    
     print('Player CardSum: ', new.CardSum['player'])
                             
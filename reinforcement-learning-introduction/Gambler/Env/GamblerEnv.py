@@ -1,24 +1,29 @@
 import numpy as np
+from scipy import sparse
+from numpy.lib.stride_tricks import sliding_window_view
 
 class GamblerEnv:
     '''
     Gambler's problem: undiscounted, episodic, finite MDP
-        final state: s = 0, or 100
-        state sapce: s = [1,99]
-        action space: a = [1, min(s,100-s)]
+        final state: s = 0, or GOAL (100)
+        state sapce: s = [1,GOAL-1]
+        action space: a = [1, min(s,GOAL-s)]
         reward: 0, or 1
-        transition: if coil flip = head, p(s',r|s,a) = 0.4
-                    else, p(s',r|s,a) = 0.6
+        transition: if coil flip = head, p(s',r|s,a) = winProb (0.4)
+                    else, p(s',r|s,a) = 1-winProb (0.6)
                     
     '''
 
-    def __init__(self):
+    def __init__(self, goal=100, winProb=0.4):
         '''
         Constructor
+        input param.:
+            @goal: reaching goal
+            @winProb: p(head)
         '''
-        self.GOAL = 100                                     # reaching goal of $100
-        self.state = [_ for _ in range(0,self.GOAL+1)]      # terminal states: 0, 100
-        self.winProb = 0.4                                  # transition probability: p(winning) = p(head) = 0.4
+        self.GOAL = goal                                    # reaching goal, e.g. $100
+        self.state = [_ for _ in range(0,self.GOAL+1)]      # terminal states: 0, GOAL
+        self.winProb = winProb                              # transition probability: p(winning) = p(head)
         
     
     def transition(self, state, action, stateValue):
@@ -57,6 +62,123 @@ class GamblerEnv:
         
         return qValue
     
+    
+    def q_values(self, stateValue, state):
+        '''
+        q(s,a) of several capitals and all stakes at once
+        input param.:
+            @stateValue: v(s) at present stage
+            @state: capitals, array
+        output param.:
+            @qValue: q(s,a), shape (len(state), GOAL//2), column j is stake a = j+1, -inf if the stake is prohibitive
+        '''
+        state = np.asarray(state)[:, None]
+        stake = np.arange(1, self.GOAL//2+1)
+        legal = stake <= np.minimum(state, self.GOAL-state)
+        win = np.clip(state+stake, 0, self.GOAL)
+        loss = np.clip(state-stake, 0, self.GOAL)
+        rewardWin = (win==self.GOAL)*1.0
+        rewardLoss = (loss==0)*-1.0
+        qValue = self.winProb*(rewardWin+stateValue[win]) + (1-self.winProb)*(rewardLoss+stateValue[loss])
+        return np.where(legal, qValue, -np.inf)
+    
+    
+    def block_q_values(self, stateValue, lo, hi):
+        '''
+        q(s,a) of the capitals s = [lo,hi) and their stakes, without index arrays
+        input param.:
+            @stateValue: v(s) at present stage
+            @lo, hi: block of capitals, 1 <= lo < hi <= GOAL
+        output param.:
+            @qValue: q(s,a), shape (hi-lo, K), column j is stake a = j+1, K = largest legal stake in the block,
+                     -inf if the stake is prohibitive
+        NOTE:
+            with W(t) = v(t) + [t==GOAL] and L(t) = v(t) - [t==0],
+            q(s,a) = winProb*W(s+a) + (1-winProb)*L(s-a),
+            the rows W(s+1..s+K) and L(s-1..s-K) are sliding windows of W and of reversed L, i.e. views, no gathers
+            legal stakes form the closed-form triangle a <= min(s,GOAL-s)
+        '''
+        capital = np.arange(lo, hi)
+        maxStake = np.minimum(capital, self.GOAL-capital)
+        K = int(maxStake.max())
+        win = np.zeros(self.GOAL+1+K)
+        win[:self.GOAL+1] = stateValue
+        win[self.GOAL] += 1
+        loss = np.zeros(self.GOAL+1+K)
+        loss[:self.GOAL+1] = stateValue[::-1]       # loss[GOAL-t] = L(t)
+        loss[self.GOAL] -= 1
+        winRow = sliding_window_view(win, K)[lo+1:hi+1]                           # W(s+1+j)
+        lossRow = sliding_window_view(loss, K)[self.GOAL-hi+2:self.GOAL-lo+2][::-1]   # L(s-1-j) = loss[GOAL-s+1+j]
+        qValue = self.winProb*winRow + (1-self.winProb)*lossRow
+        qValue[np.arange(1, K+1) > maxStake[:, None]] = -np.inf
+        return qValue
+    
+    
+    def mdp_tables(self):
+        '''
+        the env in the layout of MDP.TabularMDP: (P, R, mask, gamma, shape)
+            action j = stake j+1, j = [0, GOAL//2), legal iff j+1 <= min(s,GOAL-s)
+            reaching 0 or GOAL leaves the chain (substochastic rows), its reward is in R: R[s,a] = winProb*[s+a==GOAL] - (1-winProb)*[s-a==0]
+            the terminal states 0, GOAL keep only action 0, with no transition and R = 0, so v = 0 there
+        '''
+        nState, nAction = self.GOAL+1, self.GOAL//2
+        capital = np.arange(0, nState)[:, None]
+        stake = np.arange(1, nAction+1)[None, :]
+        mask = stake <= np.minimum(capital, self.GOAL-capital)
+        mask[[0, self.GOAL], 0] = True
+        legal = mask.copy()
+        legal[[0, self.GOAL], 0] = False
+        R = np.where(legal, self.winProb*(capital+stake==self.GOAL) - (1-self.winProb)*(capital-stake==0), 0)
+        P = []
+        for j in range(0, nAction) :
+            state = np.nonzero(legal[:, j])[0]
+            win, loss = state+j+1, state-j-1
+            row = np.concatenate([state[win<self.GOAL], state[loss>0]])
+            col = np.concatenate([win[win<self.GOAL], loss[loss>0]])
+            prob = np.concatenate([np.full(np.count_nonzero(win<self.GOAL), self.winProb), np.full(np.count_nonzero(loss>0), 1-self.winProb)])
+            P.append(sparse.csr_matrix((prob, (row, col)), shape=(nState, nState)))
+        return P, R, mask, 1.0, (nState,)
+    
+    
+    def pair_q_values(self, stateValue, state, stake):
+        '''
+        q(s,a) of pairs (state[i], stake[i]), stakes must be legal
+        input param.:
+            @stateValue: v(s) at present stage
+            @state, stake: capitals and their stakes, arrays of the same shape
+        '''
+        win = state + stake
+        loss = state - stake
+        return self.winProb*((win==self.GOAL) + stateValue[win]) + (1-self.winProb)*(stateValue[loss] - (loss==0))
+    
+    
+    def predecessors(self, state):
+        '''
+        capitals s from which a legal stake a = |state-s| reaches state, in closed form
+        output param.:
+            @win: s = [ceil(state/2), state-1], reaching state by a win: a = state-s <= s
+            @loss: s = [state+1, floor((GOAL+state)/2)], reaching state by a loss: a = s-state <= GOAL-s
+        '''
+        win = np.arange(max(1, (state+1)//2), state)
+        loss = np.arange(state+1, min(self.GOAL-1, (self.GOAL+state)//2)+1)
+        return win, loss
+    
+    
+    def predecessor_prob(self, state):
+        '''
+        max(p(state|s,a), a) of every capital s, the largest influence v(state) has on q(s,.)
+        output param.:
+            @prob: shape (GOAL+1,), 0 at the terminal states
+        NOTE:
+            a capital reaches state by at most one stake, so the max is winProb on the win predecessors
+            and 1-winProb on the loss predecessors, see predecessors(); O(GOAL) per call, no table
+        '''
+        win, loss = self.predecessors(state)
+        prob = np.zeros(self.GOAL+1)
+        prob[win] = self.winProb
+        prob[loss] = 1-self.winProb
+        return prob
+    
 ############################
 ### test        
 if __name__ == '__main__' :
@@ -1,12 +1,21 @@
 import numpy as np
-import matplotlib.pyplot as plt
+import json
+import os
+import time
 import Env.GamblerEnv as env
 
 STEPS = 100
 ERROR = 1e-3
-PH = 0.4
+PH = 0.4           # p(head), the only copy: GamblerEnv gets it as winProb
+GOAL = 100
+SOLVER = 'sweep'    # 'sweep': in-place value iteration in state order; 'batch': vectorized value iteration; 'prioritized': prioritized sweeping
+BLOCK = 2**22       # max # of (capital, stake) pairs per block of the vectorized value iteration
+EPISODES = 10**6    # # of Monte Carlo playouts of the optimal policy
+SEED = 17
+BUDGET = 100000     # max # of single-state backups of prioritized sweeping
+HEADLESS = os.environ.get('RL_HEADLESS', '0')=='1'   # write results as .npz/.json instead of plotting
 
-new = env.GamblerEnv()
+new = env.GamblerEnv(GOAL, PH)
 
 def value_iteration():
     stateValue = np.zeros(new.GOAL+1)   # state value v(s)
@@ -45,49 +54,266 @@ def value_iteration():
             print(optPolicy)
             print()  
                       
-    plt.figure()
-    plt.xlabel('Capital')
-    plt.ylabel('Value estimates')
-    plt.plot(range(1,new.GOAL), stateValue[1:new.GOAL])        
+    valuePlot(stateValue, optPolicy)
     
-    plt.figure()
-    plt.xlabel('Capital')
-    plt.ylabel('optimal policy')
-    plt.plot(range(1,new.GOAL), optPolicy[1:new.GOAL],'r.')
+    return optPolicy
+    
+def value_iteration_batch(model=new, verbose=True, block=BLOCK, steps=STEPS, init=None):
+    '''
+    vectorized value iteration: v(s) = max(q(s,a), a) of a block of capitals at once, see GamblerEnv.block_q_values
+        blocks are swept in state order and written back in place, so with one block it is synchronous
+        and with many blocks it is in between synchronous and the state-by-state sweep of value_iteration()
+        any GOAL and winProb; memory is O(block), not O(GOAL^2)
+        v(s) starts from the lower bound -1 (every capital ends at 0 or GOAL, so v(s) = p(GOAL) - p(0) >= -1):
+        from 0, stake-1 cycles keep over-estimates alive and the synchronous sweeps need ~15x more steps
+    input param.:
+        @model: GamblerEnv
+        @verbose: print v(s) and the optimal policy
+        @block: max # of (capital, stake) pairs per block
+        @steps: max # of sweeps, p_h > 0.5 (timid play) moves information one capital per sweep
+                and needs far more than STEPS, e.g. ~1200 sweeps at GOAL = 100, ~2300 at GOAL = 1000
+        @init: initial v(s), shape (GOAL+1,), e.g. a warm start; None for the lower bound -1
+    output param.:
+        @stateValue: v(s), same as value_iteration() within ERROR
+        @optPolicy: optimal stake of each capital, the smallest one among stakes within 1e-9 of the best
+                    (value_iteration() breaks these ties by rounding noise)
+        @step: # of sweeps
+        @stable: True if the last sweep changed v(s) by < ERROR, False if the sweeps stopped at steps
+    '''
+    # rows per block: legal stakes of a capital <= GOAL//2
+    rows = max(1, block // max(1, model.GOAL//2))
+    bounds = [(lo, min(lo+rows, model.GOAL)) for lo in range(1, model.GOAL, rows)]
+    if init is None :
+        stateValue = np.full(model.GOAL+1, -1.0)
+    else :
+        stateValue = np.array(init, dtype='float')
+    stateValue[[0, model.GOAL]] = 0      # terminal states
+    lastValue = np.empty(model.GOAL+1)
+    stable = False
+    for step in range(0,steps) :
+        lastValue[:] = stateValue
+        for lo, hi in bounds :
+            stateValue[lo:hi] = model.block_q_values(stateValue, lo, hi).max(axis=1)
+        stable = np.sum(np.abs(stateValue-lastValue)) < ERROR
+        if stable :
+            break
     
+    optPolicy = greedy_policy(model, stateValue, block)
+    
+    if verbose :
+        print('{} v(s) after {} sweeps: '. format('stable' if stable else 'unstable', step+1))
+        print(stateValue)
+        print()
+        print('optimal policy:')
+        print(optPolicy)
+        print()
+    return stateValue, optPolicy, step+1, stable
+    
+def greedy_policy(model, stateValue, block=BLOCK):
+    '''
+    optimal stake of each capital: the smallest one among stakes within 1e-9 of the best, blocks as in value_iteration_batch
+        uint8 while the stakes fit (GOAL <= 510), int32 otherwise
+    '''
+    rows = max(1, block // max(1, model.GOAL//2))
+    optPolicy = np.zeros(model.GOAL+1, dtype='uint8' if model.GOAL<=2*255 else 'int32')
+    for lo in range(1, model.GOAL, rows) :
+        qValue = model.block_q_values(stateValue, lo, min(lo+rows, model.GOAL))
+        optPolicy[lo:lo+len(qValue)] = np.argmax(qValue >= qValue.max(axis=1, keepdims=True)-1e-9, axis=1) + 1
     return optPolicy
     
-def real_Play(credit, policy):
+def benchmark(goals=(100, 1000, 10000), winProbs=(0.25, 0.4, 0.55)):
     '''
+    run time of value_iteration_batch over GOAL and winProb
+    '''
+    for goal in goals :
+        for winProb in winProbs :
+            model = env.GamblerEnv(goal, winProb)
+            start = time.perf_counter()
+            stateValue, _, step, stable = value_iteration_batch(model, verbose=False)
+            print('goal {}, p_h {}: {} sweeps, {}, {:.3f} s, v({}) = {:.4f}'. format(
+                  goal, winProb, step, 'stable' if stable else 'unstable', time.perf_counter()-start, goal//2, stateValue[goal//2]))
+    
+def benchmark_mdp(goals=(100, 1000)):
+    '''
+    shared MDP solvers vs. value_iteration_batch
+    needs the MDP package on the import path, see MDP/__init__.py
+    '''
+    from MDP.TabularMDP import TabularMDP      # loaded on demand
+    from MDP import Solver
+    for goal in goals :
+        model = env.GamblerEnv(goal, PH)
+        reference, _, _, _ = value_iteration_batch(model, verbose=False)
+        init = np.full(goal+1, -1.0)       # lower bound, see value_iteration_batch
+        init[[0, goal]] = 0
+        Solver.benchmark(TabularMDP.from_env(model), 'goal {}'. format(goal), reference, init)
     
+def valuePlot(stateValue, optPolicy, name='gambler'):
+    '''
+    plot v(s) and the optimal policy, or in HEADLESS mode, write them to <name>.npz and <name>.json
+    '''
+    if HEADLESS :
+        np.savez(name + '.npz', stateValue=stateValue, optPolicy=optPolicy)
+        with open(name + '.json', 'w') as f :
+            json.dump({'goal': new.GOAL, 'winProb': new.winProb, 'stateValue': stateValue.tolist(), 'optPolicy': optPolicy.tolist()}, f)
+    else :
+        import GamblerReport
+        GamblerReport.valuePlot(stateValue, optPolicy, new.GOAL)
+    
+def prioritized_sweeping(model=new, budget=BUDGET, block=BLOCK, verbose=True):
+    '''
+    Prioritized sweeping: asynchronous, in-place value iteration
+        priority of each capital is its Bellman residual max(q(s,a), a) - v(s),
+        the capital with the largest residual is backed up first: v(s) = max(q(s,a), a)
+        after v(state) changes, only q(p, |state-p|) of its predecessors p changes, see GamblerEnv.predecessors()
+        stop when the sum of residuals <= ERROR, as the L1 check of value_iteration(), or the budget is used up
+    NOTE:
+        v(s) starts from the lower bound -1, as value_iteration_batch, so v(s) and every q(s,a) only grow:
+        the best q of a predecessor is max(its best q, the one q that changed), O(1) per predecessor,
+        and a backup costs O(GOAL) instead of recomputing the q rows of O(GOAL) predecessors
+        the problem is undiscounted, so the usual bound priority(p) += max(p(s|p,a), a)*|delta| never decays
+        and over-counts, hence the exact residuals
+    input param.:
+        @model: GamblerEnv
+        @budget: max # of single-state backups
+        @block: max # of (capital, stake) pairs per block of the initial q(s,a) and of the final policy
+        @verbose: print v(s) and the optimal policy
+    output param.:
+        @stateValue: v(s)
+        @optPolicy: optimal stake of each capital, see greedy_policy()
+        @backups: # of single-state backups
+    '''
+    stateValue = np.full(model.GOAL+1, -1.0)   # state value v(s)
+    stateValue[[0, model.GOAL]] = 0            # terminal states
+    
+    # best q of each capital, and the initial residuals
+    rows = max(1, block // max(1, model.GOAL//2))
+    bestQ = np.zeros(model.GOAL+1)
+    for lo in range(1, model.GOAL, rows) :
+        hi = min(lo+rows, model.GOAL)
+        bestQ[lo:hi] = model.block_q_values(stateValue, lo, hi).max(axis=1)
+    priority = bestQ - stateValue
+    
+    backups = 0
+    while backups<budget :
+        if np.sum(priority)<=ERROR :
+            break
+        state = np.argmax(priority)
+        stateValue[state] = bestQ[state]
+        priority[state] = 0
+        backups += 1
+        # predecessors: one changed q each
+        pred = np.concatenate(model.predecessors(state))
+        bestQ[pred] = np.maximum(bestQ[pred], model.pair_q_values(stateValue, pred, np.abs(state-pred)))
+        priority[pred] = bestQ[pred] - stateValue[pred]
+    
+    optPolicy = greedy_policy(model, stateValue, block)
+    
+    if verbose :
+        if backups==budget :
+            print('Budget used up, {} backups'. format(backups))
+        else :
+            print('Stable v(s) after {} backups'. format(backups))
+        print(stateValue)
+        print()
+        print('optimal policy:')
+        print(optPolicy)
+        print()
+    
+    return stateValue, optPolicy, backups
+    
+def real_Play(credit, policy, verbose=True):
+    '''
+    one game, step by step
     ''' 
     step = 0   
     while credit>0 and credit<new.GOAL :
         step += 1
-        print('Step: ', step)
+        if verbose :
+            print('Step: ', step)
         # stake
         stake = policy[credit]  #
-        print('stake: ', stake)
+        if verbose :
+            print('stake: ', stake)
         # coin flip
-        if np.random.binomial(1, PH)==1 :   # win 
+        if np.random.binomial(1, new.winProb)==1 :   # win 
             credit += stake
-            print('WIN, present credit: ', credit)
+            if verbose :
+                print('WIN, present credit: ', credit)
         else :  # lose
             credit -= stake
-            print('LOSS, present credit: ', credit)
-        print()      
+            if verbose :
+                print('LOSS, present credit: ', credit)
+        if verbose :
+            print()      
             
-    if credit==0 :
-        print('$0')
-    elif credit==new.GOAL: 
-        print('$100')   
-    else:
-        print('Something is wrong...')        
+    if verbose :
+        if credit==0 :
+            print('$0')
+        elif credit==new.GOAL: 
+            print('$100')   
+        else:
+            print('Something is wrong...')        
     
     return credit
              
+def batch_Play(credit, policy, episodes=EPISODES, model=new, seed=SEED, verbose=True):
+    '''
+    Monte Carlo playouts of many games at once
+        capital of each game in one array, one batched coin flip per active game per step,
+        finished games are dropped from the active index set, nothing is printed inside the loop
+    input param.:
+        @credit: initial capital of every game
+        @policy: stake of each capital, shape (GOAL+1,), ValueError if a stake of a capital in [1,GOAL-1] is prohibitive
+        @episodes: # of games
+        @seed: seed of np.random.default_rng
+    output param.:
+        @winRate: fraction of games reaching GOAL
+        @ci: 95% Wilson score interval of winRate
+        @lengthCount: lengthCount[n] = # of games with n coin flips
+    '''
+    rng = np.random.default_rng(seed)
+    policy = np.asarray(policy, dtype='int64')
+    # a stake out of [1, min(s,GOAL-s)] would never end the game, or leave the state space
+    capital = np.arange(1, model.GOAL)
+    illegal = (policy[1:model.GOAL]<1) | (policy[1:model.GOAL]>np.minimum(capital, model.GOAL-capital))
+    if np.any(illegal) :
+        raise ValueError('Prohibitive stake {} at capital {}'. format(policy[1:model.GOAL][illegal][0], capital[illegal][0]))
+    capital = np.full(episodes, credit, dtype='int64')
+    length = np.zeros(episodes, dtype='int64')
+    active = np.nonzero((capital>0) & (capital<model.GOAL))[0]
+    step = 0
+    while len(active)>0 :
+        step += 1
+        stake = policy[capital[active]]
+        win = rng.random(len(active)) < model.winProb
+        capital[active] += np.where(win, stake, -stake)
+        done = (capital[active]<=0) | (capital[active]>=model.GOAL)
+        length[active[done]] = step
+        active = active[~done]
+    
+    wins = np.count_nonzero(capital>=model.GOAL)
+    winRate = wins/episodes
+    z = 1.96
+    center = (winRate + z*z/(2*episodes))/(1 + z*z/episodes)
+    half = z*np.sqrt(winRate*(1-winRate)/episodes + z*z/(4*episodes**2))/(1 + z*z/episodes)
+    lengthCount = np.bincount(length)
+    
+    if verbose :
+        meanLength = np.mean(length)
+        halfLength = z*np.std(length)/np.sqrt(episodes)
+        print('{} games from ${}: win rate {:.4f}, 95% CI [{:.4f}, {:.4f}]'. format(episodes, credit, winRate, center-half, center+half))
+        print('game length: mean {:.3f} +- {:.3f}, max {}'. format(meanLength, halfLength, len(lengthCount)-1))
+        print('length distribution:', lengthCount)
+    return winRate, (center-half, center+half), lengthCount
+             
 def main():
-    policy = value_iteration()
+    if SOLVER=='prioritized' :
+        _, policy, _ = prioritized_sweeping()
+    elif SOLVER=='batch' :
+        stateValue, policy, _, _ = value_iteration_batch()
+        valuePlot(stateValue, policy)
+    else :
+        policy = value_iteration()
     
     print()
     
@@ -95,14 +321,14 @@ def main():
 #     credit = np.random.random_integers(1,new.GOAL-1)
 #     print('Your initial credit is: ', credit)
 #     real_Play(credit, policy)
-    credit = np.zeros(5000, dtype='uint8')
-    for i in range(0,5000) :
-        credit[i] = real_Play(50, policy)
-    
-    aveCredit50 = np.mean(credit)
-    print('Average return of $50 is: ', aveCredit50)
+    start = time.perf_counter()
+    winRate, _, _ = batch_Play(new.GOAL//2, policy)
+    print('{} games in {:.2f} s'. format(EPISODES, time.perf_counter()-start))
+    print('Average return of $50 is: ', winRate*new.GOAL)
     
-    plt.show()
+    if not HEADLESS :
+        import GamblerReport
+        GamblerReport.show()
     
 if __name__ == '__main__':
     main()
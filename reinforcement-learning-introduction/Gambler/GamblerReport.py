@@ -0,0 +1,22 @@
+'''
+plotting of the Gambler's problem results; imported only when a plot is requested, 
+so that GamblerMain starts without matplotlib (see HEADLESS in GamblerMain)
+'''
+import matplotlib.pyplot as plt
+
+def valuePlot(stateValue, optPolicy, goal):
+    '''
+    plot v(s) and the optimal stake of capital [1, goal-1]
+    '''
+    plt.figure()
+    plt.xlabel('Capital')
+    plt.ylabel('Value estimates')
+    plt.plot(range(1,goal), stateValue[1:goal])        
+    
+    plt.figure()
+    plt.xlabel('Capital')
+    plt.ylabel('optimal policy')
+    plt.plot(range(1,goal), optPolicy[1:goal],'r.')
+    
+def show():
+    plt.show()
@@ -0,0 +1,101 @@
+'''
+parameter study of the Gambler's problem over (winProb, goal)
+    every point is solved by GamblerMain.value_iteration_batch, warm-started from the nearest solved point,
+    and cached on disk in CACHE as <hash>.npz, keyed by a hash of the parameters
+NOTE:
+    the sweeps stop once a sweep changes v(s) by < GamblerMain.ERROR, so a warm and a cold start
+    of the same point agree only within ERROR; the key leaves the start out, and a cached v(s)
+    is the one of whichever start solved the point first
+'''
+import numpy as np
+import hashlib
+import json
+import os
+import time
+import Env.GamblerEnv as env
+import GamblerMain
+
+CACHE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache')
+WIN_PROBS = (0.25, 0.3, 0.35, 0.4, 0.45)
+GOALS = (100, 200, 400, 1000)
+STEPS = 1000
+
+def param_key(goal, winProb, steps=STEPS):
+    '''
+    hash of everything the solution depends on
+    '''
+    param = {'goal': int(goal), 'winProb': float(winProb), 'error': GamblerMain.ERROR, 'steps': int(steps)}
+    return hashlib.sha1(json.dumps(param, sort_keys=True).encode()).hexdigest()[:16]
+
+def warm_start(goal, winProb, solved):
+    '''
+    initial v(s) from the nearest solved point
+        only points of the same goal with winProb' <= winProb are used: v(s) grows with p(head),
+        so their v(s) is a lower bound and the sweeps still rise monotonically as from -1
+    NOTE:
+        a v(s) of another goal, mapped by the fraction s/goal, is not a bound (v(s) is fractal-like in s/goal);
+        its over-estimates decay as slowly as those of a start from 0 and cost ~50x more sweeps, so it is not used
+    input param.:
+        @solved: {(winProb, goal): stateValue}
+    output param.:
+        @init: v(s), or None if nothing is usable
+    '''
+    lower = [key for key in solved if key[1]==goal and key[0]<=winProb]
+    if not lower :
+        return None
+    return solved[max(lower)]
+
+def solve(goal, winProb, init=None, steps=STEPS, cache=CACHE):
+    '''
+    solve one point, or load it from the cache
+    output param.:
+        @stateValue: v(s)
+        @optPolicy: optimal stake of each capital
+        @sweeps: # of sweeps, 0 on a cache hit
+    NOTE:
+        a point that does not converge within steps sweeps is returned but not cached
+    '''
+    path = os.path.join(cache, param_key(goal, winProb, steps) + '.npz')
+    if os.path.exists(path) :
+        with np.load(path) as data :
+            return data['stateValue'], data['optPolicy'], 0
+    model = env.GamblerEnv(goal, winProb)
+    stateValue, optPolicy, sweeps, stable = GamblerMain.value_iteration_batch(model, verbose=False, steps=steps, init=init)
+    if stable :
+        os.makedirs(cache, exist_ok=True)
+        np.savez(path, stateValue=stateValue, optPolicy=optPolicy, goal=goal, winProb=winProb)
+    return stateValue, optPolicy, sweeps
+
+def parameter_sweep(winProbs=WIN_PROBS, goals=GOALS, warm=True, steps=STEPS, cache=CACHE, verbose=True):
+    '''
+    solve the grid winProbs x goals, winProbs in increasing order so that every point but the first of a goal has a lower neighbor
+    output param.:
+        @result: {(winProb, goal): (stateValue, optPolicy, sweeps)}
+    '''
+    result = {}
+    solved = {}
+    for goal in sorted(goals) :
+        for winProb in sorted(winProbs) :
+            init = warm_start(goal, winProb, solved) if warm else None
+            start = time.perf_counter()
+            stateValue, optPolicy, sweeps = solve(goal, winProb, init, steps, cache)
+            solved[(winProb, goal)] = stateValue
+            result[(winProb, goal)] = (stateValue, optPolicy, sweeps)
+            if verbose :
+                print('p_h {}, goal {}: {}, {:.3f} s, v(goal/2) = {:.4f}'. format(
+                      winProb, goal, '{} sweeps'. format(sweeps) if sweeps else 'cached', time.perf_counter()-start, stateValue[goal//2]))
+    return result
+
+def main():
+    cache = os.path.join(CACHE, 'cold')
+    print('cold starts:')
+    cold = parameter_sweep(warm=False, cache=cache)
+    print('warm starts:')
+    warm = parameter_sweep()
+    print('sweeps, cold: {}, warm: {}'. format(sum(r[2] for r in cold.values()), sum(r[2] for r in warm.values())))
+    print('max |v_warm - v_cold|: {:.2e}'. format(max(np.max(np.abs(warm[key][0]-cold[key][0])) for key in warm)))
+    print('re-run:')
+    parameter_sweep()
+
+if __name__ == '__main__':
+    main()
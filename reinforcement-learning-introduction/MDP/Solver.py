@@ -0,0 +1,110 @@
+'''
+solvers of a TabularMDP: value iteration, policy iteration, modified policy iteration
+    all return (v(s), policy, # of iterations, seconds), v(s) and policy reshaped to mdp.shape
+    convergence: the L1 change of v(s) per sweep <= error, as in the chapter drivers
+'''
+import numpy as np
+import time
+from scipy import sparse
+from scipy.sparse import linalg
+
+ERROR = 1e-3
+STEPS = 1000
+
+
+def greedy(mdp, stateValue, policy=None):
+    '''
+    argmax(q(s,a), a); with an old policy, ties keep its action, so that policy iteration stops
+    '''
+    qValue = mdp.q_values(stateValue)
+    best = np.argmax(qValue, axis=1)
+    if policy is not None :
+        state = np.arange(mdp.nState)
+        best = np.where(qValue[state, policy] >= qValue[state, best] - 1e-12, policy, best)
+    return best, qValue
+
+
+def value_iteration(mdp, error=ERROR, steps=STEPS, init=None):
+    '''
+    v(s) = max(q(s,a), a), synchronous sweeps: one stacked sparse product per sweep
+    input param.:
+        @init: initial v(s), zeros if None
+    '''
+    start = time.perf_counter()
+    stateValue = np.zeros(mdp.nState) if init is None else np.asarray(init, dtype='float').ravel().copy()
+    for step in range(0,steps) :
+        newValue = mdp.q_values(stateValue).max(axis=1)
+        err = np.sum(np.abs(newValue-stateValue))
+        stateValue = newValue
+        if err<=error :
+            break
+    policy, _ = greedy(mdp, stateValue)
+    return stateValue.reshape(mdp.shape), policy.reshape(mdp.shape), step+1, time.perf_counter()-start
+
+
+def policy_evaluation(mdp, policy):
+    '''
+    exact v_pi: solve (I - gamma*P_pi) v = r_pi by sparse LU
+        gamma = 1 needs a proper policy, i.e. P_pi substochastic enough to reach the terminal
+    '''
+    tranPi, rewardPi = mdp.policy_model(policy)
+    system = sparse.identity(mdp.nState, format='csc') - mdp.gamma*tranPi.tocsc()
+    return linalg.spsolve(system, rewardPi)
+
+
+def policy_iteration(mdp, policy=None, steps=STEPS):
+    '''
+    exact policy evaluation & greedy improvement until the policy is stable
+    input param.:
+        @policy: initial policy, the first legal action of each state if None
+    '''
+    start = time.perf_counter()
+    policy = np.argmax(mdp.mask, axis=1) if policy is None else np.asarray(policy).ravel()
+    for step in range(0,steps) :
+        stateValue = policy_evaluation(mdp, policy)
+        newPolicy, _ = greedy(mdp, stateValue, policy)
+        if np.array_equal(newPolicy, policy) :
+            break
+        policy = newPolicy
+    return stateValue.reshape(mdp.shape), policy.reshape(mdp.shape), step+1, time.perf_counter()-start
+
+
+def modified_policy_iteration(mdp, sweeps=10, error=ERROR, steps=STEPS, init=None):
+    '''
+    greedy improvement, then sweeps partial evaluation sweeps v = r_pi + gamma*P_pi*v of the greedy policy
+        sweeps=0 is value iteration, sweeps=inf would be policy iteration
+    input param.:
+        @sweeps: # of evaluation sweeps per improvement
+    '''
+    start = time.perf_counter()
+    stateValue = np.zeros(mdp.nState) if init is None else np.asarray(init, dtype='float').ravel().copy()
+    policy = None
+    for step in range(0,steps) :
+        policy, qValue = greedy(mdp, stateValue, policy)
+        newValue = qValue[np.arange(mdp.nState), policy]
+        err = np.sum(np.abs(newValue-stateValue))
+        stateValue = newValue
+        if err<=error :
+            break
+        tranPi, rewardPi = mdp.policy_model(policy)
+        for _ in range(0,sweeps) :
+            stateValue = rewardPi + mdp.gamma*(tranPi @ stateValue)
+    policy, _ = greedy(mdp, stateValue, policy)
+    return stateValue.reshape(mdp.shape), policy.reshape(mdp.shape), step+1, time.perf_counter()-start
+
+
+def benchmark(mdp, name='', reference=None, init=None):
+    '''
+    iterations, time and max |v - v_reference| of the three solvers on one MDP
+    input param.:
+        @reference: v(s) of the environment's own solver, or None
+        @init: initial v(s) of value iteration and modified policy iteration
+    '''
+    result = {}
+    for solver, run in (('value iteration', lambda mdp : value_iteration(mdp, init=init)), ('policy iteration', policy_iteration),
+                        ('modified policy iteration', lambda mdp : modified_policy_iteration(mdp, init=init))) :
+        stateValue, policy, step, seconds = run(mdp)
+        result[solver] = (stateValue, policy, step, seconds)
+        print('{}{}: {} iterations, {:.3f} ms{}'. format(name+', ' if name else '', solver, step, 1e3*seconds,
+              '' if reference is None else ', max |v - v_ref| = {:.2e}'. format(np.max(np.abs(stateValue-reference)))))
+    return result
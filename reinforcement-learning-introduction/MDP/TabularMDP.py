@@ -0,0 +1,73 @@
+import numpy as np
+from scipy import sparse
+
+
+class TabularMDP:
+    '''
+    finite MDP in one layout for every environment
+        states s = [0, S), actions a = [0, A)
+        P[a]: p(s'|s,a), scipy.sparse CSR of shape (S, S);
+              a row may sum to < 1, the missing mass goes to an absorbing terminal of value 0 (episodic tasks)
+        R[s,a]: expected reward r(s,a) = sum(r*p(s',r|s,a), s', r), shape (S, A)
+        mask[s,a]: True if a is legal in s, every state has at least one legal action
+        gamma: discount
+    NOTE:
+        the P[a] are also stacked into one CSR matrix of shape (A*S, S), row a*S+s,
+        so that q(s,a) of all states and actions is one sparse matrix-vector product
+    '''
+
+    def __init__(self, P, R, mask=None, gamma=1.0, shape=None):
+        '''
+        Constructor
+        input param.:
+            @P: list of A sparse matrices (or dense arrays) of shape (S, S)
+            @R: r(s,a), shape (S, A)
+            @mask: legal actions, shape (S, A), all legal if None
+            @gamma: discount
+            @shape: shape of the state space of the environment, for reshaping v(s); (S,) if None
+        '''
+        self.P = [sparse.csr_matrix(p) for p in P]
+        self.R = np.asarray(R, dtype='float')
+        self.nState, self.nAction = self.R.shape
+        if len(self.P)!=self.nAction or any(p.shape!=(self.nState, self.nState) for p in self.P) :
+            raise ValueError('P must hold one (S, S) matrix per action')
+        self.mask = np.ones(self.R.shape, dtype='bool') if mask is None else np.asarray(mask, dtype='bool')
+        if not np.all(self.mask.any(axis=1)) :
+            raise ValueError('every state needs a legal action')
+        self.gamma = gamma
+        self.shape = (self.nState,) if shape is None else tuple(shape)
+        self.stack = sparse.vstack(self.P, format='csr')
+    
+    
+    @classmethod
+    def from_env(cls, model):
+        '''
+        TabularMDP of an environment with mdp_tables() -> (P, R, mask, gamma, shape)
+        '''
+        return cls(*model.mdp_tables())
+    
+    
+    def q_values(self, stateValue):
+        '''
+        q(s,a) = R[s,a] + gamma * sum(P[a][s,s']*v(s'), s'), -inf for illegal actions
+        input param.:
+            @stateValue: v(s), shape (S,)
+        output param.:
+            @qValue: shape (S, A)
+        '''
+        qValue = self.R + self.gamma*(self.stack @ stateValue).reshape(self.nAction, self.nState).T
+        qValue[~self.mask] = -np.inf
+        return qValue
+    
+    
+    def policy_model(self, policy):
+        '''
+        P_pi, r_pi of a deterministic policy
+        input param.:
+            @policy: action of each state, shape (S,)
+        output param.:
+            @tranPi: P_pi, CSR of shape (S, S), the rows policy[s]*S+s of the stacked P
+            @rewardPi: r_pi, shape (S,)
+        '''
+        state = np.arange(self.nState)
+        return self.stack[policy*self.nState + state], self.R[state, policy]
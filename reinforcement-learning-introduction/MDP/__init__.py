@@ -0,0 +1,9 @@
+#############################################
+## tabular MDP core shared by the chapters ##
+## GridWorld, Gambler, CarRental           ##
+#############################################
+#
+# the chapters import it as the top-level package MDP, so the parent folder of MDP,
+# reinforcement-learning-introduction, must be on the import path, e.g. from a chapter folder:
+#     PYTHONPATH=.. python GridWorld.py
+# only the benchmark_mdp/benchmarkMDP functions of the drivers load it, on demand